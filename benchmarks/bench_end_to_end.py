@@ -0,0 +1,126 @@
+"""
+End-to-end benchmark of main() against local mock OpenAI and Weblate servers.
+
+Builds a synthetic project, points the clients at the mocks through
+OPENAI_BASE_URL and WEBLATE_API_URL and reports throughput, requests, tokens
+and wall time. Arguments after -- are passed to main.py unchanged:
+
+    python benchmarks/bench_end_to_end.py --components 8 --languages 4 --entries 1000 \
+        --latency 0.5 --error-rate 0.02 --malformed-rate 0.02 -- --workers 8 --batch-concurrency 4
+"""
+import argparse
+import json
+import logging
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'src'))
+
+from mock_openai import MockOpenAIServer  # noqa: E402
+from mock_weblate import MockWeblateServer  # noqa: E402
+
+
+def parse_arguments():
+    parser = argparse.ArgumentParser(description='Benchmark main() against local mock servers')
+    parser.add_argument('--components', type=int, help='Number of components in the project', default=4)
+    parser.add_argument('--languages', type=int, help='Number of languages per component', default=3)
+    parser.add_argument('--entries', type=int, help='Entries per translation file', default=500)
+    parser.add_argument('--pending-ratio', type=float, help='Share of entries that need translation', default=0.3)
+    parser.add_argument('--latency', type=float, help='Seconds per OpenAI request', default=0.2)
+    parser.add_argument('--latency-per-item', type=float, help='Extra seconds per translated item', default=0.005)
+    parser.add_argument('--error-rate', type=float, help='Share of OpenAI requests failing with 500', default=0.0)
+    parser.add_argument('--rate-limit-rate', type=float, help='Share of OpenAI requests failing with 429', default=0.0)
+    parser.add_argument('--malformed-rate', type=float, help='Share of OpenAI replies that are truncated or incomplete', default=0.0)
+    parser.add_argument('--batch-latency', type=float, help='Seconds before a mock batch job completes', default=1.0)
+    parser.add_argument('--weblate-latency', type=float, help='Seconds per Weblate request', default=0.0)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--json', action='store_true', help='Print the report as json')
+    parser.add_argument('--verbose', action='store_true', help='Keep the translator console log')
+    return parser.parse_known_args()
+
+
+def main():
+    args, main_args = parse_arguments()
+    if main_args[:1] == ['--']:
+        main_args = main_args[1:]
+
+    openai_server = MockOpenAIServer(
+        latency=args.latency,
+        latency_per_item=args.latency_per_item,
+        error_rate=args.error_rate,
+        rate_limit_rate=args.rate_limit_rate,
+        malformed_rate=args.malformed_rate,
+        batch_latency=args.batch_latency,
+        seed=args.seed,
+    ).start()
+    weblate_server = MockWeblateServer(
+        components=args.components,
+        languages=args.languages,
+        entries=args.entries,
+        pending_ratio=args.pending_ratio,
+        latency=args.weblate_latency,
+        seed=args.seed,
+    ).start()
+    pending = weblate_server.pending()
+
+    os.environ['OPENAI_BASE_URL'] = openai_server.base_url
+    os.environ['OPENAI_KEY'] = 'mock'
+    os.environ['WEBLATE_API_URL'] = weblate_server.base_url
+    os.environ['WEBLATE_API_KEY'] = 'mock'
+
+    # translation.log and the state file of --incremental go to a scratch directory
+    workdir = tempfile.mkdtemp(prefix='translator-bench-')
+    os.chdir(workdir)
+
+    import main as translator_main
+
+    if not args.verbose:
+        for handler in logging.getLogger().handlers:
+            if type(handler) is logging.StreamHandler:
+                handler.setLevel(logging.WARNING)
+
+    sys.argv = ['main.py', '--project', weblate_server.project] + main_args
+    started = time.perf_counter()
+    translator_main.main()
+    wall_time = time.perf_counter() - started
+
+    openai_stats = openai_server.stats.as_dict()
+    weblate_stats = weblate_server.stats.as_dict()
+    openai_server.shutdown()
+    weblate_server.shutdown()
+
+    tokens = openai_stats['prompt_tokens'] + openai_stats['completion_tokens']
+    report = {
+        'arguments': main_args,
+        'pending_strings': pending,
+        'translated_strings': weblate_stats['translated'],
+        'wall_time_seconds': round(wall_time, 3),
+        'strings_per_second': round(weblate_stats['translated'] / wall_time, 2),
+        'tokens_per_second': round(tokens / wall_time, 2),
+        'openai': openai_stats,
+        'weblate': weblate_stats,
+        'log_directory': workdir,
+    }
+
+    if args.json:
+        print(json.dumps(report, indent=2))
+        return
+
+    print(f"arguments:          {' '.join(main_args) or '(defaults)'}")
+    print(f"translated strings: {report['translated_strings']} of {pending} pending")
+    print(f"wall time:          {wall_time:.2f}s")
+    print(f"strings/sec:        {report['strings_per_second']:.2f}")
+    print(f"openai requests:    {openai_stats['requests']} "
+          f"({openai_stats['errors']} errors, {openai_stats['malformed']} malformed)")
+    print(f"openai tokens:      {openai_stats['prompt_tokens']} prompt, {openai_stats['completion_tokens']} completion "
+          f"({report['tokens_per_second']:.0f}/s)")
+    print(f"weblate requests:   {weblate_stats['requests']} "
+          f"({weblate_stats['downloads']} downloads, {weblate_stats['uploads']} uploads, "
+          f"{weblate_stats['unit_patches']} unit patches)")
+    print(f"log directory:      {workdir}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,106 @@
+"""
+Micro-benchmark for selecting the entries of a PO file that need translation.
+
+Compares the old membership test against po.untranslated_entries() with the
+single-pass predicate in translator.select_messages_to_translate, checks the
+selection against the entries built to need translation and checks that the
+time per entry stays flat as the file grows.
+
+    python benchmarks/bench_selection.py --sizes 1000 2000 4000 8000 16000
+"""
+import argparse
+import os
+import sys
+import time
+from typing import List, Tuple
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'src'))
+
+import polib  # noqa: E402
+
+from translator import select_messages_to_translate  # noqa: E402
+
+
+def build_po(size: int) -> Tuple[polib.POFile, List[polib.POEntry]]:
+    # Returns the file and the entries that need translation
+    po = polib.POFile()
+    expected = []
+    for i in range(size):
+        kind = i % 7
+        if kind in (4, 5):
+            entry = polib.POEntry(msgid=f'{i} message', msgid_plural=f'{i} messages', msgctxt=f'context {i % 5}')
+        else:
+            entry = polib.POEntry(msgid=f'Message number {i}', msgctxt=f'context {i % 5}')
+
+        if kind == 0:
+            entry.msgstr = ''
+        elif kind == 1:
+            entry.msgstr = f'Nachricht Nummer {i}'
+        elif kind == 2:
+            entry.msgstr = f'Alte Nachricht {i}'
+            entry.flags.append('fuzzy')
+        elif kind == 3:
+            # Obsolete entries, translated or not, are never selected
+            entry.msgstr = f'Entfernte Nachricht {i}' if i % 2 else ''
+            entry.obsolete = True
+        elif kind == 4:
+            entry.msgstr_plural = {0: f'{i} Nachricht', 1: f'{i} Nachrichten'}
+        elif kind == 5:
+            entry.msgstr_plural = {0: f'{i} Nachricht', 1: ''}
+        else:
+            entry.msgstr = f'Nachricht {i}'
+
+        if kind in (0, 2, 5):
+            expected.append(entry)
+        po.append(entry)
+    return po, expected
+
+
+def select_quadratic(po: polib.POFile):
+    # The original selection, timed for comparison. It also picked translated plural
+    # entries and obsolete fuzzy ones, so its result is not checked.
+    messages_to_translate = []
+    untranslated_messages = po.untranslated_entries()
+    for message in po:
+        if message in untranslated_messages or message.msgstr == '' or message.fuzzy:
+            messages_to_translate.append(message)
+    return messages_to_translate
+
+
+def measure(function, po: polib.POFile, repeat: int) -> float:
+    best = float('inf')
+    for _ in range(repeat):
+        started = time.perf_counter()
+        function(po)
+        best = min(best, time.perf_counter() - started)
+    return best
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark PO entry selection')
+    parser.add_argument('--sizes', type=int, nargs='+', default=[1000, 2000, 4000, 8000])
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--skip-quadratic', action='store_true', help='Only measure the single-pass selection')
+    args = parser.parse_args()
+
+    print(f"{'entries':>8} {'single pass':>12} {'us/entry':>9} {'quadratic':>10} {'us/entry':>9}")
+    per_entry = []
+    for size in args.sizes:
+        po, expected = build_po(size)
+        assert [id(entry) for entry in select_messages_to_translate(po)] == [id(entry) for entry in expected]
+
+        linear = measure(select_messages_to_translate, po, args.repeat)
+        per_entry.append(linear / size)
+        quadratic = None if args.skip_quadratic else measure(select_quadratic, po, 1)
+        print(f"{size:>8} {linear:>11.4f}s {linear / size * 1e6:>9.2f}"
+              + (f" {quadratic:>9.4f}s {quadratic / size * 1e6:>9.2f}" if quadratic is not None else ''))
+
+    # Linear scaling means the time per entry does not grow with the file size
+    growth = per_entry[-1] / per_entry[0]
+    print(f"time per entry grew {growth:.2f}x from {args.sizes[0]} to {args.sizes[-1]} entries")
+    if growth > 3:
+        sys.exit("selection does not scale linearly")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,73 @@
+"""
+Synthetic PO corpora for the benchmarks.
+"""
+import random
+from typing import Optional
+
+import polib
+
+WORDS = (
+    'account', 'add', 'cancel', 'change', 'close', 'delete', 'download', 'edit', 'error', 'file',
+    'folder', 'group', 'help', 'invite', 'language', 'message', 'name', 'open', 'password', 'project',
+    'remove', 'save', 'search', 'settings', 'share', 'show', 'sign', 'team', 'update', 'upload', 'user',
+)
+
+PLACEHOLDERS = ('%s', '%d', '{name}', '{count}', '<b>', '</b>')
+
+
+def build_sentence(rng: random.Random, words: int) -> str:
+    sentence = ' '.join(rng.choice(WORDS) for _ in range(words)).capitalize()
+    if rng.random() < 0.2:
+        sentence += ' ' + rng.choice(PLACEHOLDERS)
+    return sentence
+
+
+def build_po(
+        entries: int,
+        language: str = 'de',
+        pending_ratio: float = 0.3,
+        fuzzy_ratio: float = 0.05,
+        plural_ratio: float = 0.05,
+        shared_ratio: float = 0.2,
+        seed: Optional[int] = 0) -> polib.POFile:
+    """
+    Builds a PO file of the given size. A share of the messages comes from a small
+    common vocabulary so the same source strings appear in several components.
+    """
+    rng = random.Random(seed)
+    shared_rng = random.Random(0)
+    shared = [build_sentence(shared_rng, shared_rng.randint(1, 4)) for _ in range(max(1, entries // 20))]
+
+    po = polib.POFile()
+    po.metadata = {
+        'Content-Type': 'text/plain; charset=UTF-8',
+        'Language': language,
+        'Plural-Forms': 'nplurals=2; plural=(n != 1);',
+    }
+    seen = set()
+    for i in range(entries):
+        if rng.random() < shared_ratio:
+            msgid = rng.choice(shared)
+        else:
+            msgid = build_sentence(rng, rng.randint(2, 12))
+        msgctxt = f'context {i}' if msgid in seen else None
+        seen.add(msgid)
+
+        roll = rng.random()
+        if rng.random() < plural_ratio:
+            entry = polib.POEntry(msgid=msgid, msgid_plural=msgid + ' items', msgctxt=msgctxt)
+            if roll < pending_ratio:
+                entry.msgstr_plural = {0: '', 1: ''}
+            else:
+                entry.msgstr_plural = {0: f'[{language}] {msgid}', 1: f'[{language}] {msgid} items'}
+        else:
+            entry = polib.POEntry(msgid=msgid, msgctxt=msgctxt)
+            if roll >= pending_ratio:
+                entry.msgstr = f'[{language}] {msgid}'
+
+        if pending_ratio <= roll < pending_ratio + fuzzy_ratio:
+            entry.flags.append('fuzzy')
+        entry.occurrences = [(f'src/module_{i % 50}.py', str(i))]
+        po.append(entry)
+
+    return po
@@ -0,0 +1,369 @@
+"""
+Local stand-in for the OpenAI Chat Completions, Files and Batch APIs.
+
+Translates every item of the json list in the prompt by prefixing it with the
+target language, as a tool call when the request offers tools. Latency, error
+rate and malformed replies are configurable so the retry and rate limit paths
+can be exercised. Requests with stream set get the reply as server-sent events
+in small chunks. Batch jobs run the same completions in a background thread
+and finish after batch_latency seconds.
+"""
+import itertools
+import json
+import math
+import random
+import re
+import threading
+import time
+from email.parser import BytesParser
+from email.policy import HTTP
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Dict, List, Optional, Tuple
+
+LANGUAGE_PATTERN = re.compile(r'translate them to (.+?)\.')
+# Characters of reply text per streamed chunk
+STREAM_CHUNK_SIZE = 16
+
+
+def estimate_tokens(text: str) -> int:
+    return math.ceil(len(text.encode('utf-8')) / 4)
+
+
+def extract_items(prompt: str) -> List[Dict[str, Any]]:
+    start = prompt.rfind('[{')
+    end = prompt.rfind('}]')
+    if start == -1 or end == -1:
+        return []
+    return json.loads(prompt[start:end + 2])
+
+
+def stream_chunks(completion: Dict[str, Any], include_usage: bool) -> List[Dict[str, Any]]:
+    # Splits a chat completion into the chunks of a streamed reply
+    message = completion['choices'][0]['message']
+    tool_calls = message.get('tool_calls')
+    text = tool_calls[0]['function']['arguments'] if tool_calls else message['content']
+
+    def chunk(delta: Dict[str, Any], finish_reason: Optional[str] = None) -> Dict[str, Any]:
+        return {
+            'id': completion['id'],
+            'object': 'chat.completion.chunk',
+            'created': completion['created'],
+            'model': completion['model'],
+            'choices': [{'index': 0, 'delta': delta, 'finish_reason': finish_reason}],
+        }
+
+    chunks = [chunk({'role': 'assistant', 'content': None if tool_calls else ''})]
+    for start in range(0, len(text), STREAM_CHUNK_SIZE):
+        piece = text[start:start + STREAM_CHUNK_SIZE]
+        if tool_calls:
+            function = {'arguments': piece}
+            tool_call: Dict[str, Any] = {'index': 0, 'function': function}
+            if start == 0:
+                tool_call.update(id=tool_calls[0]['id'], type='function')
+                function['name'] = tool_calls[0]['function']['name']
+            chunks.append(chunk({'tool_calls': [tool_call]}))
+        else:
+            chunks.append(chunk({'content': piece}))
+    chunks.append(chunk({}, completion['choices'][0]['finish_reason']))
+
+    if include_usage:
+        chunks.append({**chunk({}), 'choices': [], 'usage': completion['usage']})
+    return chunks
+
+
+def translate_item(item: Dict[str, Any], language: str) -> Dict[str, Any]:
+    translated = {'id': item['id'], 'text': f"[{language}] {item['text']}"}
+    if 'text_plural' in item:
+        translated['text_plural'] = f"[{language}] {item['text_plural']}"
+    return translated
+
+
+class MockOpenAIStats:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.requests = 0
+        self.errors = 0
+        self.malformed = 0
+        self.prompt_tokens = 0
+        self.completion_tokens = 0
+        self.items = 0
+        self.batch_jobs = 0
+
+    def add(self, **counts: int):
+        with self.lock:
+            for name, value in counts.items():
+                setattr(self, name, getattr(self, name) + value)
+
+    def as_dict(self) -> Dict[str, int]:
+        with self.lock:
+            return {name: value for name, value in vars(self).items() if name != 'lock'}
+
+
+class MockOpenAIServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(
+            self,
+            address: Tuple[str, int] = ('127.0.0.1', 0),
+            latency: float = 0.2,
+            latency_per_item: float = 0.005,
+            error_rate: float = 0.0,
+            rate_limit_rate: float = 0.0,
+            malformed_rate: float = 0.0,
+            batch_latency: float = 1.0,
+            requests_per_minute: int = 10000,
+            tokens_per_minute: int = 10000000,
+            seed: Optional[int] = None):
+        super().__init__(address, MockOpenAIHandler)
+        self.latency = latency
+        self.latency_per_item = latency_per_item
+        self.error_rate = error_rate
+        self.rate_limit_rate = rate_limit_rate
+        self.malformed_rate = malformed_rate
+        self.batch_latency = batch_latency
+        self.requests_per_minute = requests_per_minute
+        self.tokens_per_minute = tokens_per_minute
+        self.random = random.Random(seed)
+        self.random_lock = threading.Lock()
+        self.stats = MockOpenAIStats()
+        self.ids = itertools.count(1)
+        self.files: Dict[str, Dict[str, Any]] = {}
+        self.batches: Dict[str, Dict[str, Any]] = {}
+
+    @property
+    def base_url(self) -> str:
+        host, port = self.server_address[:2]
+        return f'http://{host}:{port}/v1'
+
+    def start(self) -> 'MockOpenAIServer':
+        threading.Thread(target=self.serve_forever, name='MockOpenAI', daemon=True).start()
+        return self
+
+    def roll(self) -> float:
+        with self.random_lock:
+            return self.random.random()
+
+    def complete(self, request: Dict[str, Any], sleep: bool = True) -> Tuple[int, Dict[str, Any], Dict[str, str]]:
+        # Returns the status, body and extra headers of one chat completion
+        prompt = request['messages'][-1]['content']
+        items = extract_items(prompt)
+        language_match = LANGUAGE_PATTERN.search(prompt)
+        language = language_match.group(1) if language_match else 'xx'
+
+        if sleep:
+            time.sleep(self.latency + self.latency_per_item * len(items))
+
+        roll = self.roll()
+        self.stats.add(requests=1)
+
+        if roll < self.rate_limit_rate:
+            self.stats.add(errors=1)
+            return 429, {'error': {'message': 'Rate limit reached', 'type': 'requests'}}, {'retry-after': '1'}
+
+        if roll < self.rate_limit_rate + self.error_rate:
+            self.stats.add(errors=1)
+            return 500, {'error': {'message': 'Mock server error', 'type': 'server_error'}}, {}
+
+        translated = [translate_item(item, language) for item in items]
+        tool_call = bool(request.get('tools'))
+        if tool_call:
+            content = json.dumps({'translations': translated}, ensure_ascii=False)
+        else:
+            content = json.dumps(translated, ensure_ascii=False)
+
+        if roll < self.rate_limit_rate + self.error_rate + self.malformed_rate:
+            self.stats.add(malformed=1)
+            # Either truncated mid-array or with an item dropped, plain replies also wrapped in chatter
+            if self.roll() < 0.5:
+                content = content[:max(1, len(content) // 2)]
+            elif tool_call:
+                content = json.dumps({'translations': translated[1:]}, ensure_ascii=False)
+            else:
+                content = 'Here are the translations:\n' + json.dumps(translated[1:], ensure_ascii=False)
+
+        prompt_tokens = estimate_tokens(prompt)
+        completion_tokens = estimate_tokens(content)
+        self.stats.add(prompt_tokens=prompt_tokens, completion_tokens=completion_tokens, items=len(items))
+
+        if tool_call:
+            message = {
+                'role': 'assistant',
+                'content': None,
+                'tool_calls': [{
+                    'id': f'call_mock_{next(self.ids)}',
+                    'type': 'function',
+                    'function': {'name': request['tools'][0]['function']['name'], 'arguments': content},
+                }],
+            }
+        else:
+            message = {'role': 'assistant', 'content': content}
+
+        return 200, {
+            'id': f'chatcmpl-mock-{next(self.ids)}',
+            'object': 'chat.completion',
+            'created': int(time.time()),
+            'model': request.get('model', 'gpt-4'),
+            'choices': [{
+                'index': 0,
+                'message': message,
+                'finish_reason': 'tool_calls' if tool_call else 'stop',
+            }],
+            'usage': {
+                'prompt_tokens': prompt_tokens,
+                'completion_tokens': completion_tokens,
+                'total_tokens': prompt_tokens + completion_tokens,
+            },
+        }, {}
+
+    def add_file(self, content: bytes, filename: str, purpose: str) -> Dict[str, Any]:
+        file_id = f'file-mock-{next(self.ids)}'
+        self.files[file_id] = {
+            'id': file_id,
+            'object': 'file',
+            'bytes': len(content),
+            'created_at': int(time.time()),
+            'filename': filename,
+            'purpose': purpose,
+            'status': 'processed',
+            'content': content,
+        }
+        return {name: value for name, value in self.files[file_id].items() if name != 'content'}
+
+    def create_batch(self, request: Dict[str, Any]) -> Dict[str, Any]:
+        batch_id = f'batch-mock-{next(self.ids)}'
+        batch = {
+            'id': batch_id,
+            'object': 'batch',
+            'endpoint': request['endpoint'],
+            'input_file_id': request['input_file_id'],
+            'completion_window': request['completion_window'],
+            'status': 'validating',
+            'created_at': int(time.time()),
+            'output_file_id': None,
+            'error_file_id': None,
+            'request_counts': {'total': 0, 'completed': 0, 'failed': 0},
+        }
+        self.batches[batch_id] = batch
+        self.stats.add(batch_jobs=1)
+        threading.Thread(target=self.run_batch, args=(batch,), name=f'MockBatch-{batch_id}', daemon=True).start()
+        return dict(batch)
+
+    def run_batch(self, batch: Dict[str, Any]):
+        lines = self.files[batch['input_file_id']]['content'].decode('utf-8').splitlines()
+        batch['status'] = 'in_progress'
+        batch['request_counts']['total'] = len(lines)
+        outputs = []
+        errors = []
+        for line in lines:
+            request = json.loads(line)
+            status, body, _ = self.complete(request['body'], sleep=False)
+            result = {'id': f'batch-req-{next(self.ids)}', 'custom_id': request['custom_id']}
+            if status == 200:
+                outputs.append({**result, 'response': {'status_code': status, 'body': body}, 'error': None})
+                batch['request_counts']['completed'] += 1
+            else:
+                errors.append({**result, 'response': {'status_code': status, 'body': body}, 'error': None})
+                batch['request_counts']['failed'] += 1
+
+        time.sleep(self.batch_latency)
+        batch['output_file_id'] = self.add_file(
+            '\n'.join(json.dumps(output) for output in outputs).encode('utf-8'), 'output.jsonl', 'batch_output')['id']
+        if errors:
+            batch['error_file_id'] = self.add_file(
+                '\n'.join(json.dumps(error) for error in errors).encode('utf-8'), 'errors.jsonl', 'batch_output')['id']
+        batch['completed_at'] = int(time.time())
+        batch['status'] = 'completed'
+
+
+class MockOpenAIHandler(BaseHTTPRequestHandler):
+    server: MockOpenAIServer
+
+    def log_message(self, format, *args):
+        pass
+
+    def send_json(self, status: int, body: Dict[str, Any], headers: Optional[Dict[str, str]] = None):
+        payload = json.dumps(body).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(payload)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def send_events(self, chunks: List[Dict[str, Any]], headers: Dict[str, str]):
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/event-stream')
+        self.send_header('Connection', 'close')
+        for name, value in headers.items():
+            self.send_header(name, value)
+        self.end_headers()
+        for chunk in chunks:
+            self.wfile.write(f'data: {json.dumps(chunk)}\n\n'.encode('utf-8'))
+            self.wfile.flush()
+        self.wfile.write(b'data: [DONE]\n\n')
+        self.close_connection = True
+
+    def rate_limit_headers(self) -> Dict[str, str]:
+        server = self.server
+        return {
+            'x-ratelimit-limit-requests': str(server.requests_per_minute),
+            'x-ratelimit-limit-tokens': str(server.tokens_per_minute),
+            'x-ratelimit-remaining-requests': str(server.requests_per_minute - 1),
+            'x-ratelimit-remaining-tokens': str(server.tokens_per_minute - 1),
+            'x-ratelimit-reset-requests': '1s',
+            'x-ratelimit-reset-tokens': '1s',
+        }
+
+    def read_body(self) -> bytes:
+        length = int(self.headers.get('Content-Length') or 0)
+        return self.rfile.read(length)
+
+    def path_parts(self) -> List[str]:
+        parts = [part for part in self.path.split('?')[0].split('/') if part]
+        return parts[1:] if parts[:1] == ['v1'] else parts
+
+    def do_POST(self):
+        parts = self.path_parts()
+        if parts == ['chat', 'completions']:
+            request = json.loads(self.read_body() or b'{}')
+            status, body, headers = self.server.complete(request)
+            if status == 200 and request.get('stream'):
+                include_usage = bool((request.get('stream_options') or {}).get('include_usage'))
+                self.send_events(stream_chunks(body, include_usage), self.rate_limit_headers())
+            else:
+                self.send_json(status, body, {**self.rate_limit_headers(), **headers})
+        elif parts == ['files']:
+            self.create_file()
+        elif parts == ['batches']:
+            self.send_json(200, self.server.create_batch(json.loads(self.read_body() or b'{}')))
+        else:
+            self.send_json(404, {'error': {'message': f'Unknown path {self.path}'}})
+
+    def do_GET(self):
+        parts = self.path_parts()
+        server = self.server
+        if len(parts) == 3 and parts[0] == 'files' and parts[2] == 'content' and parts[1] in server.files:
+            payload = server.files[parts[1]]['content']
+            self.send_response(200)
+            self.send_header('Content-Type', 'application/octet-stream')
+            self.send_header('Content-Length', str(len(payload)))
+            self.end_headers()
+            self.wfile.write(payload)
+        elif len(parts) == 2 and parts[0] == 'batches' and parts[1] in server.batches:
+            self.send_json(200, dict(server.batches[parts[1]]))
+        else:
+            self.send_json(404, {'error': {'message': f'Unknown path {self.path}'}})
+
+    def create_file(self):
+        message = BytesParser(policy=HTTP).parsebytes(
+            b'Content-Type: ' + self.headers['Content-Type'].encode('latin-1') + b'\r\n\r\n' + self.read_body())
+        fields = {}
+        filename = 'upload.jsonl'
+        for part in message.iter_parts():
+            name = part.get_param('name', header='content-disposition')
+            fields[name] = part.get_payload(decode=True)
+            if name == 'file':
+                filename = part.get_filename() or filename
+        purpose = (fields.get('purpose') or b'batch').decode('utf-8')
+        self.send_json(200, self.server.add_file(fields.get('file') or b'', filename, purpose))
@@ -0,0 +1,345 @@
+"""
+Local stand-in for the parts of the Weblate REST API the translator uses.
+
+Serves one project of synthetic components and languages: component and
+translation listings, file download and upload, repository operations,
+units and changes. Uploaded and patched translations are merged back so the
+statistics reflect what the translator did.
+"""
+import json
+import threading
+import time
+from email.parser import BytesParser
+from email.policy import HTTP
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Dict, List, Optional, Tuple
+from urllib.parse import parse_qs, urlparse
+
+import polib
+
+from corpus import build_po
+
+PAGE_SIZE = 50
+STATE_EMPTY = 0
+STATE_FUZZY = 10
+STATE_TRANSLATED = 20
+
+LANGUAGE_NAMES = {
+    'cs': 'Czech', 'de': 'German', 'es': 'Spanish', 'fr': 'French', 'it': 'Italian',
+    'ja': 'Japanese', 'nl': 'Dutch', 'pl': 'Polish', 'pt': 'Portuguese', 'sv': 'Swedish',
+}
+
+
+def entry_state(entry: polib.POEntry) -> int:
+    if entry.fuzzy:
+        return STATE_FUZZY
+    return STATE_TRANSLATED if entry.translated() else STATE_EMPTY
+
+
+def entry_key(entry: polib.POEntry) -> Tuple[str, str, str]:
+    return entry.msgid, entry.msgid_plural or '', entry.msgctxt or ''
+
+
+class MockTranslation:
+    def __init__(self, project: str, component: str, language: str, po: polib.POFile):
+        self.project = project
+        self.component = component
+        self.language = language
+        self.po = po
+        self.lock = threading.Lock()
+        self.unit_ids: List[int] = []
+
+    @property
+    def path(self) -> str:
+        return f'translations/{self.project}/{self.component}/{self.language}/'
+
+    def pending(self) -> int:
+        return sum(1 for entry in self.po if entry_state(entry) < STATE_TRANSLATED)
+
+
+class MockWeblateStats:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.requests = 0
+        self.downloads = 0
+        self.uploads = 0
+        self.commits = 0
+        self.pushes = 0
+        self.unit_patches = 0
+        self.translated = 0
+        self.bytes_downloaded = 0
+        self.bytes_uploaded = 0
+
+    def add(self, **counts: int):
+        with self.lock:
+            for name, value in counts.items():
+                setattr(self, name, getattr(self, name) + value)
+
+    def as_dict(self) -> Dict[str, int]:
+        with self.lock:
+            return {name: value for name, value in vars(self).items() if name != 'lock'}
+
+
+class MockWeblateServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(
+            self,
+            address: Tuple[str, int] = ('127.0.0.1', 0),
+            project: str = 'bench',
+            components: int = 4,
+            languages: int = 3,
+            entries: int = 500,
+            pending_ratio: float = 0.3,
+            latency: float = 0.0,
+            seed: int = 0):
+        super().__init__(address, MockWeblateHandler)
+        self.project = project
+        self.latency = latency
+        self.stats = MockWeblateStats()
+        self.translations: Dict[str, MockTranslation] = {}
+        self.units: List[Tuple[MockTranslation, polib.POEntry]] = []
+        self.created = time.strftime('%Y-%m-%dT%H:%M:%SZ', time.gmtime())
+
+        language_codes = list(LANGUAGE_NAMES)[:languages]
+        for c in range(components):
+            for l, language in enumerate(language_codes):
+                po = build_po(entries, language=language, pending_ratio=pending_ratio, seed=seed + c * 1000 + l)
+                translation = MockTranslation(project, f'component-{c}', language, po)
+                for entry in po:
+                    translation.unit_ids.append(len(self.units))
+                    self.units.append((translation, entry))
+                self.translations[translation.path] = translation
+
+    @property
+    def base_url(self) -> str:
+        host, port = self.server_address[:2]
+        return f'http://{host}:{port}/api/'
+
+    def start(self) -> 'MockWeblateServer':
+        threading.Thread(target=self.serve_forever, name='MockWeblate', daemon=True).start()
+        return self
+
+    def pending(self) -> int:
+        return sum(translation.pending() for translation in self.translations.values())
+
+    def components(self) -> List[str]:
+        return sorted({translation.component for translation in self.translations.values()})
+
+    def translation_json(self, translation: MockTranslation) -> Dict[str, Any]:
+        with translation.lock:
+            total = len(translation.po)
+            translated = total - translation.pending()
+        return {
+            'url': self.base_url + translation.path,
+            'filename': f'locale/{translation.language}/LC_MESSAGES/{translation.component}.po',
+            'language_code': translation.language,
+            'is_source': False,
+            'language': {'code': translation.language, 'name': LANGUAGE_NAMES[translation.language]},
+            'component': {'slug': translation.component, 'project': {'slug': translation.project}},
+            'total': total,
+            'translated': translated,
+        }
+
+    def unit_json(self, unit_id: int) -> Dict[str, Any]:
+        translation, entry = self.units[unit_id]
+        if entry.msgid_plural:
+            source = [entry.msgid, entry.msgid_plural]
+            target = [entry.msgstr_plural.get(i, '') for i in sorted(entry.msgstr_plural)]
+        else:
+            source = [entry.msgid]
+            target = [entry.msgstr]
+        return {
+            'id': unit_id,
+            'url': f'{self.base_url}units/{unit_id}/',
+            'translation': self.base_url + translation.path,
+            'source': source,
+            'target': target,
+            'context': entry.msgctxt or '',
+            'state': entry_state(entry),
+        }
+
+
+class MockWeblateHandler(BaseHTTPRequestHandler):
+    server: MockWeblateServer
+
+    def log_message(self, format, *args):
+        pass
+
+    def send_body(self, status: int, payload: bytes, content_type: str):
+        self.send_response(status)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def send_json(self, status: int, body: Any):
+        self.send_body(status, json.dumps(body).encode('utf-8'), 'application/json')
+
+    def send_page(self, results: List[Any], query: Dict[str, List[str]]):
+        page = int(query.get('page', ['1'])[0])
+        start = (page - 1) * PAGE_SIZE
+        next_url = None
+        if start + PAGE_SIZE < len(results):
+            params = '&'.join(f'{name}={values[0]}' for name, values in query.items() if name != 'page')
+            next_url = f'http://{self.headers["Host"]}{urlparse(self.path).path}?page={page + 1}' + (f'&{params}' if params else '')
+        self.send_json(200, {
+            'count': len(results),
+            'next': next_url,
+            'previous': None,
+            'results': results[start:start + PAGE_SIZE],
+        })
+
+    def read_body(self) -> bytes:
+        length = int(self.headers.get('Content-Length') or 0)
+        return self.rfile.read(length)
+
+    def route(self) -> Tuple[List[str], Dict[str, List[str]]]:
+        self.server.stats.add(requests=1)
+        if self.server.latency:
+            time.sleep(self.server.latency)
+        url = urlparse(self.path)
+        parts = [part for part in url.path.split('/') if part]
+        if parts and parts[0] == 'api':
+            parts = parts[1:]
+        return parts, parse_qs(url.query)
+
+    def find_translation(self, parts: List[str]) -> Optional[MockTranslation]:
+        return self.server.translations.get('/'.join(['translations'] + parts[1:4]) + '/')
+
+    def do_GET(self):
+        parts, query = self.route()
+        server = self.server
+
+        if parts[:1] == ['projects'] and parts[2:] == ['components']:
+            self.send_page([{
+                'slug': component,
+                'name': component,
+                'project': {'slug': parts[1]},
+                'translations_url': f'{server.base_url}components/{parts[1]}/{component}/translations/',
+            } for component in server.components() if parts[1] == server.project], query)
+            return
+
+        if parts[:1] == ['projects'] and parts[2:] == ['changes']:
+            # Every pending unit is reported as changed after the requested timestamp
+            self.send_page([{
+                'timestamp': server.created,
+                'action': 31,
+                'action_name': 'New string added',
+                'unit': unit['url'],
+                'translation': unit['translation'],
+            } for unit in (server.unit_json(i) for i in range(len(server.units)))
+                if unit['state'] < STATE_TRANSLATED], query)
+            return
+
+        if parts[:1] == ['components'] and parts[3:] == ['translations']:
+            self.send_page([
+                server.translation_json(translation)
+                for translation in server.translations.values()
+                if translation.project == parts[1] and translation.component == parts[2]
+            ], query)
+            return
+
+        if parts[:1] == ['units'] and len(parts) == 2:
+            if not parts[1].isdigit() or int(parts[1]) >= len(server.units):
+                self.send_json(404, {'detail': 'Not found.'})
+            else:
+                self.send_json(200, server.unit_json(int(parts[1])))
+            return
+
+        translation = self.find_translation(parts) if parts[:1] == ['translations'] else None
+        if translation is None:
+            self.send_json(404, {'detail': 'Not found.'})
+            return
+
+        if parts[4:] == []:
+            self.send_json(200, server.translation_json(translation))
+        elif parts[4:] == ['file']:
+            with translation.lock:
+                payload = str(translation.po).encode('utf-8')
+            server.stats.add(downloads=1, bytes_downloaded=len(payload))
+            self.send_body(200, payload, 'text/x-po; charset=utf-8')
+        elif parts[4:] == ['units']:
+            state_filter = query.get('q', [''])[0] == 'state:<translated'
+            self.send_page([
+                unit for unit in (server.unit_json(i) for i in translation.unit_ids)
+                if not state_filter or unit['state'] < STATE_TRANSLATED
+            ], query)
+        else:
+            self.send_json(404, {'detail': 'Not found.'})
+
+    def do_POST(self):
+        parts, _ = self.route()
+        translation = self.find_translation(parts) if parts[:1] == ['translations'] else None
+        if translation is None:
+            self.send_json(404, {'detail': 'Not found.'})
+            return
+
+        body = self.read_body()
+        if parts[4:] == ['file']:
+            self.upload(translation, body)
+        elif parts[4:] == ['repository']:
+            operation = json.loads(body or b'{}').get('operation')
+            self.server.stats.add(commits=int(operation == 'commit'), pushes=int(operation == 'push'))
+            self.send_json(200, {'result': True})
+        else:
+            self.send_json(404, {'detail': 'Not found.'})
+
+    def upload(self, translation: MockTranslation, body: bytes):
+        message = BytesParser(policy=HTTP).parsebytes(
+            b'Content-Type: ' + self.headers['Content-Type'].encode('latin-1') + b'\r\n\r\n' + body)
+        contents = None
+        for part in message.iter_parts():
+            if part.get_param('name', header='content-disposition') == 'file':
+                contents = part.get_payload(decode=True)
+        if contents is None:
+            self.send_json(400, {'detail': 'Missing file.'})
+            return
+
+        uploaded = {entry_key(entry): entry for entry in polib.pofile(contents.decode('utf-8'))}
+        accepted = 0
+        with translation.lock:
+            for entry in translation.po:
+                new = uploaded.get(entry_key(entry))
+                if new is None or entry_state(entry) == STATE_TRANSLATED or not new.translated():
+                    continue
+                entry.msgstr = new.msgstr
+                entry.msgstr_plural = dict(new.msgstr_plural)
+                if entry.fuzzy:
+                    entry.flags.remove('fuzzy')
+                accepted += 1
+
+        self.server.stats.add(uploads=1, translated=accepted, bytes_uploaded=len(contents))
+        self.send_json(200, {
+            'accepted': accepted,
+            'count': len(uploaded),
+            'not_found': 0,
+            'result': True,
+            'skipped': len(uploaded) - accepted,
+            'total': len(uploaded),
+        })
+
+    def do_PATCH(self):
+        parts, _ = self.route()
+        if parts[:1] != ['units'] or len(parts) != 2:
+            self.send_json(404, {'detail': 'Not found.'})
+            return
+
+        unit_id = int(parts[1])
+        translation, entry = self.server.units[unit_id]
+        data = json.loads(self.read_body() or b'{}')
+        target = data.get('target') or ['']
+        with translation.lock:
+            was_pending = entry_state(entry) < STATE_TRANSLATED
+            if entry.msgid_plural:
+                entry.msgstr_plural = {i: text for i, text in enumerate(target)}
+            else:
+                entry.msgstr = target[0]
+            if data.get('state') == STATE_TRANSLATED and entry.fuzzy:
+                entry.flags.remove('fuzzy')
+            elif data.get('state') == STATE_FUZZY and not entry.fuzzy:
+                entry.flags.append('fuzzy')
+            translated = was_pending and entry_state(entry) == STATE_TRANSLATED
+
+        self.server.stats.add(unit_patches=1, translated=int(translated))
+        self.send_json(200, self.server.unit_json(unit_id))
@@ -0,0 +1,102 @@
+import asyncio
+import logging
+from typing import Any, Dict, Optional, Tuple
+
+from polib import POFile
+
+import metrics
+from file_transfer import (
+    TRANSLATE_ATTEMPTS, TRANSLATE_PAUSE_SECONDS, download_translation_async, record_finished, upload_translation_async)
+from log_config import translation_task_name
+from retry import retry_call_async
+from selection import filter_pending, job_name, list_selected_translations_async
+from translator import AsyncTranslator
+from weblate_client import AsyncWeblateClient
+
+logger = logging.getLogger(__name__)
+
+
+async def perform_translations(
+        translator: AsyncTranslator,
+        po_file_contents: str,
+        language_code: str) -> Tuple[Optional[POFile], int]:
+    async def translate() -> Tuple[POFile, int]:
+        translated_po, translated_count = await translator.tanslate_po_file(po_file_contents, language_code)
+        logger.info('Successfully performed %d translations for %s', translated_count, language_code)
+        return translated_po, translated_count
+
+    result = await retry_call_async(
+        translate, f'perform translations for {language_code}', 'translate',
+        TRANSLATE_ATTEMPTS, TRANSLATE_PAUSE_SECONDS)
+    return result or (None, 0)
+
+
+async def translate(
+        weblate: AsyncWeblateClient,
+        translator: AsyncTranslator,
+        translation: Dict[str, Any],
+        slots: asyncio.Semaphore) -> bool:
+    translation_task_name.set(job_name(translation))
+    translation_url = translation['url']
+
+    async with slots:
+        metrics.queue_depth.dec(queue='jobs')
+        logger.info('Starting translation process for %s', translation_url)
+
+        file_contents = await download_translation_async(weblate, translation_url)
+        if not file_contents:
+            logger.error('Failed to download translation file for %s. Aborting translation.', translation_url)
+            return False
+
+        language_code = translation['language_code']
+        language_name = translation['language']['name']
+        logger.info('Translating for language: %s-%s', language_code, language_name)
+        translated_po, translated_count = await perform_translations(
+            translator, file_contents, f'{language_code}-{language_name}')
+
+        if not translated_po:
+            logger.error('Failed to translate file for %s. Aborting translation.', translation_url)
+            return False
+
+        if translated_count == 0:
+            logger.info('No new translations found for %s - translation process complete.', translation_url)
+            return True
+
+        logger.info('Found %d new translations for %s', translated_count, translation_url)
+
+        upload_result = await upload_translation_async(weblate, translation, translated_po)
+
+        if not upload_result:
+            logger.error('Failed to upload translation file for %s', translation_url)
+            return False
+
+        record_finished(translation_url, translated_count)
+
+        return True
+
+
+async def main_async(args, translator_kwargs: Dict[str, Any]) -> bool:
+    # One translator for the whole run: its semaphore bounds OpenAI requests across all files
+    translator = AsyncTranslator(**{**translator_kwargs, 'concurrency': args.batch_concurrency * args.workers})
+    slots = asyncio.Semaphore(max(1, args.workers))
+
+    async with AsyncWeblateClient(max_connections=args.weblate_max_connections or 100) as weblate:
+        tasks = []
+        translations = await list_selected_translations_async(weblate, args.project, args.components, args.languages)
+        if not args.include_complete:
+            translations = filter_pending(translations)
+
+        for translation in translations:
+            logger.info('Queueing translation task %s', job_name(translation))
+            # Tasks waiting for a slot are the jobs queue of the async mode
+            metrics.queue_depth.inc(queue='jobs')
+            tasks.append(asyncio.create_task(translate(weblate, translator, translation, slots)))
+
+        logger.info("Running %d translation tasks, %d at a time", len(tasks), args.workers)
+        results = await asyncio.gather(*tasks, return_exceptions=True)
+
+        for result in results:
+            if isinstance(result, Exception):
+                logger.error("Translation task failed: %s", result)
+
+        return all(result is True for result in results)
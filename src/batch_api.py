@@ -0,0 +1,239 @@
+import json
+import logging
+import os
+import tempfile
+import time
+from typing import Any, Dict, List, Optional, Tuple
+
+from openai import OpenAI
+from polib import POEntry
+
+import metrics
+import timing
+from model_routing import MODEL, ModelRouter
+from openai_client import get_openai_client
+from retry import retry_call
+from translation_memory import TranslationMemory
+from translator import apply_structured_reply, build_request, group_by_source, resolve_duplicates
+
+logger = logging.getLogger(__name__)
+
+ENDPOINT = '/v1/chat/completions'
+COMPLETION_WINDOW = '24h'
+COMPLETION_WINDOW_SECONDS = 24 * 3600
+# Polling stops this long after the completion window, or after this many failed polls in a row
+WAIT_MARGIN_SECONDS = 3600
+MAX_POLL_FAILURES = 10
+# Limit of the Batch API per input file
+MAX_REQUESTS_PER_JOB = 50000
+FINAL_STATUSES = ('completed', 'failed', 'expired', 'cancelled')
+
+
+def build_batch_line(
+        custom_id: str,
+        batch: List[POEntry],
+        language: str,
+        structured_output: bool = True,
+        model: str = MODEL) -> Dict[str, Any]:
+    return {
+        'custom_id': custom_id,
+        'method': 'POST',
+        'url': ENDPOINT,
+        'body': build_request(batch, language, structured_output, model),
+    }
+
+
+def write_batch_file(path: str, lines: List[Dict[str, Any]]):
+    with open(path, 'w', encoding='utf-8') as file:
+        for line in lines:
+            file.write(json.dumps(line, ensure_ascii=False) + '\n')
+
+
+def parse_batch_output(text: str) -> Dict[str, Dict[str, Any]]:
+    # Maps custom_id to the chat completion of every request that succeeded
+    completions = {}
+    for line in text.splitlines():
+        if not line.strip():
+            continue
+
+        result = json.loads(line)
+        response = result.get('response') or {}
+        if result.get('error') or response.get('status_code') != 200:
+            logger.warning("Batch request %s failed: %s", result.get('custom_id'), result.get('error') or response.get('body'))
+            continue
+
+        completions[result['custom_id']] = response['body']
+    return completions
+
+
+def completion_reply(completion: Dict[str, Any]) -> Tuple[Optional[str], Optional[str]]:
+    # Returns the content and the tool call arguments of a chat completion in json form
+    message = completion['choices'][0]['message']
+    tool_calls = message.get('tool_calls')
+    return message.get('content'), tool_calls[0]['function']['arguments'] if tool_calls else None
+
+
+def record_batch_usage(completion: Dict[str, Any]):
+    usage = completion.get('usage')
+    if usage:
+        metrics.openai_tokens.inc(usage['prompt_tokens'], direction='in')
+        metrics.openai_tokens.inc(usage['completion_tokens'], direction='out')
+        timing.summary.record_tokens(usage['prompt_tokens'], usage['completion_tokens'])
+
+
+class BatchTranslator:
+    """
+    Translates messages through the OpenAI Batch API: every request goes into one JSONL
+    file, the file is submitted as a batch job and the replies are applied once it completes.
+    Batch jobs do not count against the per-minute rate limits and cost less than
+    interactive requests, at the price of waiting up to the completion window.
+    """
+    def __init__(
+            self,
+            memory: Optional[TranslationMemory] = None,
+            token_budget: Optional[Dict[str, int]] = None,
+            poll_seconds: float = 60,
+            batch_file: Optional[str] = None,
+            openai: Optional[OpenAI] = None,
+            structured_output: bool = True,
+            router: Optional[ModelRouter] = None):
+        self.openai = openai or get_openai_client()
+        self.memory = memory
+        self.token_budget = token_budget
+        self.poll_seconds = poll_seconds
+        self.batch_file = batch_file
+        self.structured_output = structured_output
+        self.router = router or ModelRouter()
+
+    def translate_entries(self, entries_by_language: Dict[str, List[POEntry]]) -> List[POEntry]:
+        # Returns the entries that could not be translated
+        requests: Dict[str, Tuple[List[POEntry], str]] = {}
+        groups_by_language = {}
+        for language, entries in entries_by_language.items():
+            groups = group_by_source(entries)
+            groups_by_language[language] = groups
+            unique_entries = [group[0] for group in groups.values()]
+            if self.memory:
+                unique_entries = self.memory.fill(unique_entries, language)
+
+            for batch in self.router.pack(unique_entries, language, self.token_budget):
+                metrics.batch_size.observe(len(batch))
+                requests[f'request-{len(requests)}'] = (batch, language)
+
+        failed: List[POEntry] = []
+        if requests:
+            logger.info("Translating %d messages in %d batch requests", sum(len(batch) for batch, _ in requests.values()), len(requests))
+            completions = self.run(requests)
+            for custom_id, (batch, language) in requests.items():
+                completion = completions.get(custom_id)
+                if completion is None:
+                    failed.extend(batch)
+                    continue
+
+                record_batch_usage(completion)
+                batch_failed = apply_structured_reply(batch, *completion_reply(completion))
+                failed.extend(batch_failed)
+                if self.memory:
+                    failed_ids = {id(entry) for entry in batch_failed}
+                    self.memory.store([entry for entry in batch if id(entry) not in failed_ids], language)
+
+            logger.info("Batch API translated %d messages, %d left untranslated",
+                        sum(len(batch) for batch, _ in requests.values()) - len(failed), len(failed))
+
+        untranslated = []
+        for groups in groups_by_language.values():
+            untranslated.extend(resolve_duplicates(groups, failed))
+        return untranslated
+
+    def run(self, requests: Dict[str, Tuple[List[POEntry], str]]) -> Dict[str, Dict[str, Any]]:
+        custom_ids = list(requests)
+        jobs = []
+        for start in range(0, len(custom_ids), MAX_REQUESTS_PER_JOB):
+            lines = [
+                build_batch_line(
+                    custom_id, *requests[custom_id], self.structured_output,
+                    self.router.route(*requests[custom_id]))
+                for custom_id in custom_ids[start:start + MAX_REQUESTS_PER_JOB]
+            ]
+            jobs.append(self.submit(lines, len(jobs)))
+
+        completions = {}
+        for batch_id in jobs:
+            if batch_id:
+                completions.update(self.collect(batch_id))
+        return completions
+
+    def submit(self, lines: List[Dict[str, Any]], index: int) -> Optional[str]:
+        ATTEMPTS = 3
+        PAUSE_SECONDS = 60
+
+        if self.batch_file:
+            root, extension = os.path.splitext(self.batch_file)
+            path = self.batch_file if index == 0 else f'{root}-{index}{extension or ".jsonl"}'
+        else:
+            path = os.path.join(tempfile.gettempdir(), f'translator-batch-{os.getpid()}-{index}.jsonl')
+        write_batch_file(path, lines)
+        logger.info("Wrote %d batch requests to %s", len(lines), path)
+
+        def submit_file() -> str:
+            with open(path, 'rb') as file:
+                input_file = self.openai.files.create(file=file, purpose='batch')
+            batch = self.openai.batches.create(
+                input_file_id=input_file.id,
+                endpoint=ENDPOINT,
+                completion_window=COMPLETION_WINDOW,
+            )
+            logger.info('Submitted batch job %s for %d requests', batch.id, len(lines))
+            return batch.id
+
+        return retry_call(submit_file, f'submit batch file {path}', 'batch_submit', ATTEMPTS, PAUSE_SECONDS)
+
+    def collect(self, batch_id: str) -> Dict[str, Dict[str, Any]]:
+        with timing.span('batch_wait'):
+            batch = self.wait(batch_id)
+        if batch is None:
+            return {}
+        if batch.status != 'completed':
+            # Expired jobs still return the requests that finished in time
+            logger.error("Batch job %s ended with status %s", batch_id, batch.status)
+
+        counts = batch.request_counts
+        if counts:
+            logger.info("Batch job %s: %d completed, %d failed", batch_id, counts.completed, counts.failed)
+        if not batch.output_file_id:
+            return {}
+
+        try:
+            return parse_batch_output(self.openai.files.content(batch.output_file_id).text)
+        except Exception as e:
+            logger.exception("Failed to read the results of batch job %s: %s", batch_id, str(e))
+            return {}
+
+    def wait(self, batch_id: str) -> Optional[Any]:
+        # Polls until the job reaches a final status. Returns None if polling keeps failing
+        # or the job outlives its completion window, so its requests fall back to interactive ones.
+        deadline = time.monotonic() + COMPLETION_WINDOW_SECONDS + WAIT_MARGIN_SECONDS
+        status = None
+        failures = 0
+        while True:
+            try:
+                batch = self.openai.batches.retrieve(batch_id)
+                failures = 0
+            except Exception as e:
+                failures += 1
+                logger.warning("Failed to poll batch job %s (%d/%d): %s", batch_id, failures, MAX_POLL_FAILURES, str(e))
+                if failures >= MAX_POLL_FAILURES:
+                    logger.error("Giving up on batch job %s after %d failed polls", batch_id, failures)
+                    return None
+            else:
+                if batch.status != status:
+                    status = batch.status
+                    logger.info("Batch job %s is %s", batch_id, status)
+                if status in FINAL_STATUSES:
+                    return batch
+
+            if time.monotonic() >= deadline:
+                logger.error("Giving up on batch job %s, still %s after its completion window", batch_id, status)
+                return None
+
+            time.sleep(self.poll_seconds)
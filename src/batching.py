@@ -0,0 +1,132 @@
+import json
+import math
+from typing import Dict, List, Optional
+
+from polib import POEntry
+
+# Context window of each model, shared between the prompt and the reply
+MODEL_TOKEN_BUDGETS: Dict[str, int] = {
+    'gpt-4': 8192,
+    'gpt-4-32k': 32768,
+    'gpt-4-turbo': 128000,
+    'gpt-4o': 128000,
+    'gpt-4o-mini': 128000,
+    'gpt-3.5-turbo': 16385,
+}
+DEFAULT_TOKEN_BUDGET = 8192
+
+# Most tokens each model writes in one reply, whatever the context window leaves.
+# Models missing here can use the whole context window for the reply.
+MODEL_MAX_OUTPUT_TOKENS: Dict[str, int] = {
+    'gpt-4-turbo': 4096,
+    'gpt-4o': 4096,
+    'gpt-4o-mini': 16384,
+    'gpt-3.5-turbo': 4096,
+}
+
+# Key of a --token-budget that applies to every model without a budget of its own
+ALL_MODELS = '*'
+
+# Fixed instructions around the json list, in tokens
+PROMPT_OVERHEAD_TOKENS = 100
+# Translations are often longer than english and non-latin scripts need more tokens per character
+COMPLETION_FACTOR = 2.0
+# The object or tool call arguments around the translated json list, in tokens
+REPLY_OVERHEAD_TOKENS = 10
+# Leave room for the estimate being off
+SAFETY_MARGIN = 0.8
+
+MAX_MESSAGES_PER_BATCH = 250
+
+
+def estimate_tokens(text: str) -> int:
+    # Roughly 4 bytes per token for english text in the OpenAI tokenizers
+    return math.ceil(len(text.encode('utf-8')) / 4)
+
+
+def estimate_entry_tokens(entry: POEntry) -> int:
+    item = {"id": 0, "text": entry.msgid}
+    if entry.msgid_plural:
+        item["text_plural"] = entry.msgid_plural
+    return estimate_tokens(json.dumps(item)) + 1
+
+
+def estimate_completion_tokens(batch: List[POEntry]) -> int:
+    return sum(math.ceil(estimate_entry_tokens(entry) * COMPLETION_FACTOR) for entry in batch)
+
+
+def estimate_prompt_tokens(batch: List[POEntry]) -> int:
+    return PROMPT_OVERHEAD_TOKENS + sum(estimate_entry_tokens(entry) for entry in batch)
+
+
+def model_limit(limits: Dict[str, int], model: str) -> Optional[int]:
+    # Dated snapshots such as gpt-4o-2024-05-13 share the limits of their model
+    names = [name for name in limits if model == name or model.startswith(name + '-')]
+    return limits[max(names, key=len)] if names else None
+
+
+def context_window(model: str) -> int:
+    return model_limit(MODEL_TOKEN_BUDGETS, model) or DEFAULT_TOKEN_BUDGET
+
+
+def max_output_tokens(model: str) -> int:
+    return model_limit(MODEL_MAX_OUTPUT_TOKENS, model) or context_window(model)
+
+
+def token_budget(model: str, budgets: Optional[Dict[str, int]] = None) -> int:
+    # Budgets are keyed by model, ALL_MODELS applies to the others
+    if budgets:
+        budget = model_limit(budgets, model) or budgets.get(ALL_MODELS)
+        if budget:
+            return budget
+    return context_window(model)
+
+
+def max_completion_tokens(batch: List[POEntry], model: str) -> int:
+    # The max_tokens of a request: the estimated reply of the batch with the safety margin,
+    # within the output limit of the model and what the prompt leaves of the context window.
+    # OpenAI counts max_tokens against the tokens per minute quota, so it is not set higher than needed.
+    # The schema of the reply tool is not estimated, so another PROMPT_OVERHEAD_TOKENS are kept free for it.
+    left = context_window(model) - math.ceil(estimate_prompt_tokens(batch) / SAFETY_MARGIN) - PROMPT_OVERHEAD_TOKENS
+    needed = math.ceil((estimate_completion_tokens(batch) + REPLY_OVERHEAD_TOKENS) / SAFETY_MARGIN)
+    return max(1, min(needed, max_output_tokens(model), left))
+
+
+def pack_batches(
+        entries: List[POEntry],
+        model: str,
+        budgets: Optional[Dict[str, int]] = None,
+        max_messages: int = MAX_MESSAGES_PER_BATCH) -> List[List[POEntry]]:
+    """
+    Greedily packs entries into batches whose estimated prompt and completion tokens fit the model budget
+    and whose estimated completion tokens fit the output limit of the model, so replies are not cut off.
+    """
+    available = int(token_budget(model, budgets) * SAFETY_MARGIN) - PROMPT_OVERHEAD_TOKENS
+    available_completion = int(max_output_tokens(model) * SAFETY_MARGIN)
+
+    batches: List[List[POEntry]] = []
+    batch: List[POEntry] = []
+    batch_tokens = 0
+    batch_completion_tokens = 0
+    for entry in entries:
+        prompt_tokens = estimate_entry_tokens(entry)
+        completion_tokens = math.ceil(prompt_tokens * COMPLETION_FACTOR)
+        entry_tokens = prompt_tokens + completion_tokens
+        if batch and (
+                batch_tokens + entry_tokens > available
+                or batch_completion_tokens + completion_tokens > available_completion
+                or len(batch) >= max_messages):
+            batches.append(batch)
+            batch = []
+            batch_tokens = 0
+            batch_completion_tokens = 0
+
+        # An entry larger than the budget still goes out on its own
+        batch.append(entry)
+        batch_tokens += entry_tokens
+        batch_completion_tokens += completion_tokens
+
+    if batch:
+        batches.append(batch)
+
+    return batches
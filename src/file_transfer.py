@@ -0,0 +1,125 @@
+import logging
+from typing import Any, BinaryIO, Dict, Optional, Union
+
+from polib import POFile
+
+import timing
+from retry import retry_call, retry_call_async
+from translator import render_translation_file
+from weblate_client import AsyncWeblateClient, WeblateClient, get_weblate_client
+
+logger = logging.getLogger(__name__)
+
+# Downloads, uploads and translations of whole files, shared by every mode
+DOWNLOAD_ATTEMPTS = 3
+DOWNLOAD_PAUSE_SECONDS = 60
+UPLOAD_ATTEMPTS = 5
+UPLOAD_PAUSE_SECONDS = 120
+TRANSLATE_ATTEMPTS = 3
+TRANSLATE_PAUSE_SECONDS = 120
+
+
+def upload_filename(translation: Dict[str, Any]) -> str:
+    return translation['filename'].split('/')[-1]
+
+
+def render_upload(translation: Dict[str, Any], translated_po: POFile) -> Optional[str]:
+    # Renders the file in the format of the translation, None if the format is not supported
+    try:
+        return render_translation_file(translated_po, translation['filename'].split('.')[-1])
+    except ValueError as e:
+        logger.error("Failed to render translation file for %s: %s", translation['url'], str(e))
+        return None
+
+
+def publish(weblate: WeblateClient, translation: Dict[str, Any], contents: Union[str, bytes, BinaryIO]) -> Dict[str, Any]:
+    # Uploads the file, then commits and pushes it
+    translation_url = translation['url']
+    with timing.span('upload'):
+        upload_result = weblate.upload_translation(translation_url, upload_filename(translation), contents)
+
+        logger.info('Committing translation file for %s', translation_url)
+        weblate.commit(translation_url)
+
+        logger.info('Pushing translation file for %s', translation_url)
+        weblate.push(translation_url)
+
+    logger.info('Successfully uploaded translations for %s', translation_url)
+    return upload_result
+
+
+async def publish_async(weblate: AsyncWeblateClient, translation: Dict[str, Any], contents: Union[str, bytes]) -> Dict[str, Any]:
+    translation_url = translation['url']
+    with timing.span('upload'):
+        upload_result = await weblate.upload_translation(translation_url, upload_filename(translation), contents)
+
+        logger.info('Committing translation file for %s', translation_url)
+        await weblate.commit(translation_url)
+
+        logger.info('Pushing translation file for %s', translation_url)
+        await weblate.push(translation_url)
+
+    logger.info('Successfully uploaded translations for %s', translation_url)
+    return upload_result
+
+
+def download_translation(translation: Dict[str, Any]) -> Optional[str]:
+    # Returns po file contents as string
+    translation_url = translation['url']
+
+    def download() -> str:
+        with timing.span('download'):
+            file = get_weblate_client().download_translation(translation_url, file_format='po')
+        logger.info('Successfully downloaded translation file for %s', translation_url)
+        return file.decode('utf-8')
+
+    return retry_call(
+        download, f'download translation file for {translation_url}', 'download',
+        DOWNLOAD_ATTEMPTS, DOWNLOAD_PAUSE_SECONDS)
+
+
+async def download_translation_async(weblate: AsyncWeblateClient, translation_url: str) -> Optional[str]:
+    async def download() -> str:
+        with timing.span('download'):
+            file = await weblate.download_translation(translation_url, file_format='po')
+        logger.info('Successfully downloaded translation file for %s', translation_url)
+        return file.decode('utf-8')
+
+    return await retry_call_async(
+        download, f'download translation file for {translation_url}', 'download',
+        DOWNLOAD_ATTEMPTS, DOWNLOAD_PAUSE_SECONDS)
+
+
+def upload_translation(translation: Dict[str, Any], translated_po: POFile) -> Optional[Dict[str, Any]]:
+    contents = render_upload(translation, translated_po)
+    if contents is None:
+        return None
+
+    return retry_call(
+        lambda: publish(get_weblate_client(), translation, contents),
+        f"upload translation file for {translation['url']}", 'upload',
+        UPLOAD_ATTEMPTS, UPLOAD_PAUSE_SECONDS)
+
+
+async def upload_translation_async(
+        weblate: AsyncWeblateClient,
+        translation: Dict[str, Any],
+        translated_po: POFile) -> Optional[Dict[str, Any]]:
+    contents = render_upload(translation, translated_po)
+    if contents is None:
+        return None
+
+    return await retry_call_async(
+        lambda: publish_async(weblate, translation, contents),
+        f"upload translation file for {translation['url']}", 'upload',
+        UPLOAD_ATTEMPTS, UPLOAD_PAUSE_SECONDS)
+
+
+def record_finished(translation_url: str, translated_count: int):
+    timing.summary.record_strings(translated_count)
+    logger.info('Translation process finished successfully', extra={
+        'translation_url': translation_url,
+        'status': 'success',
+        'action': 'translate',
+        'translated_count': translated_count
+    })
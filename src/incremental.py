@@ -0,0 +1,174 @@
+import json
+import logging
+import os
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+from typing import Any, Callable, Dict, List, Optional, Set, Tuple
+
+import httpx
+
+from retry import retry_call
+from scheduler import Job, run_jobs
+from selection import job_name, list_selected_translations
+from units import fetch_pending_units, translate_units, unit_needs_translation
+from weblate_client import get_weblate_client
+
+logger = logging.getLogger(__name__)
+
+# Weblate change actions that can leave a unit needing translation. Translations, comments and uploads,
+# including the ones this tool makes after the watermark of its run, would only bring back translated units.
+ACTION_NEW_SOURCE = 13
+ACTION_SOURCE_CHANGE = 30
+ACTION_NEW_UNIT = 31
+ACTION_MARKED_EDIT = 37
+TRANSLATABLE_ACTIONS = {ACTION_NEW_SOURCE, ACTION_SOURCE_CHANGE, ACTION_NEW_UNIT, ACTION_MARKED_EDIT}
+
+
+def utc_now() -> str:
+    return datetime.now(timezone.utc).isoformat()
+
+
+def load_watermark(state_file: str, project: str) -> Optional[str]:
+    if not os.path.exists(state_file):
+        return None
+
+    with open(state_file, encoding='utf-8') as f:
+        state = json.load(f)
+    return state.get('watermarks', {}).get(project)
+
+
+def save_watermark(state_file: str, project: str, timestamp: str):
+    state: Dict[str, Any] = {}
+    if os.path.exists(state_file):
+        with open(state_file, encoding='utf-8') as f:
+            state = json.load(f)
+
+    state.setdefault('watermarks', {})[project] = timestamp
+
+    # Write atomically so an interrupted run never leaves a corrupt state file
+    temporary_file = f'{state_file}.tmp'
+    with open(temporary_file, 'w', encoding='utf-8') as f:
+        json.dump(state, f, indent=2)
+    os.replace(temporary_file, state_file)
+    logger.info("Recorded watermark %s for project %s", timestamp, project)
+
+
+def component_key(translation: Dict[str, Any]) -> Tuple[str, str]:
+    component = translation['component']
+    return component['project']['slug'].lower(), component['slug'].lower()
+
+
+# Returned by a fetch of an object that was deleted since its change
+DELETED: Dict[str, Any] = {}
+
+
+def fetch_object(fetch: Callable[[str], Dict[str, Any]], url: str) -> Tuple[bool, Optional[Dict[str, Any]]]:
+    # Returns whether the fetch succeeded and the object, None for objects deleted since the change
+    ATTEMPTS = 3
+    PAUSE_SECONDS = 10
+
+    def fetch_existing() -> Dict[str, Any]:
+        try:
+            return fetch(url)
+        except httpx.HTTPStatusError as e:
+            if e.response.status_code != 404:
+                raise
+            logger.warning("Skipping %s, it no longer exists", url)
+            return DELETED
+
+    result = retry_call(fetch_existing, f'fetch {url}', 'download', ATTEMPTS, PAUSE_SECONDS, log_attempts=False)
+    if result is None:
+        return False, None
+    return True, None if result is DELETED else result
+
+
+def translate_changes(args, translator_kwargs: Dict[str, Any], since: str) -> bool:
+    """
+    Translates only the units changed in the project since the given timestamp.
+    Only new or edited source strings, new strings and strings marked for edit are considered.
+    A change to a source string marks every pending unit of its component for translation,
+    as the translations of that string are units of the other languages.
+    Returns False if some changed unit could not be fetched, so the watermark stays put.
+    """
+    weblate = get_weblate_client()
+    translations = {
+        translation['url']: translation
+        for translation in list_selected_translations(weblate, args.project, args.components, args.languages, args.workers)
+    }
+    selected_components = {component_key(translation) for translation in translations.values()}
+
+    unit_urls = []
+    seen_unit_urls = set()
+    other_translation_urls: Set[str] = set()
+    skipped_count = 0
+    for change in weblate.list_changes(args.project, since):
+        unit_url = change.get('unit')
+        translation_url = change.get('translation')
+        if not unit_url or not translation_url:
+            continue
+        if change.get('action') not in TRANSLATABLE_ACTIONS:
+            skipped_count += 1
+            continue
+
+        if translation_url not in translations:
+            # Either a source string or a language that is not selected
+            other_translation_urls.add(translation_url)
+        elif unit_url not in seen_unit_urls:
+            seen_unit_urls.add(unit_url)
+            unit_urls.append(unit_url)
+    logger.info("Found %d changed units since %s, skipped %d changes that need no translation", len(unit_urls), since, skipped_count)
+
+    success = True
+    with ThreadPoolExecutor(max_workers=max(1, args.workers)) as executor:
+        other_translations = list(executor.map(
+            lambda url: fetch_object(weblate.get_translation, url), sorted(other_translation_urls)))
+        changed_components = set()
+        for fetched, translation in other_translations:
+            success = success and fetched
+            if translation and translation.get('is_source') and component_key(translation) in selected_components:
+                changed_components.add(component_key(translation))
+
+        source_changed = [
+            translation for translation in translations.values()
+            if component_key(translation) in changed_components
+        ]
+        if changed_components:
+            logger.info("Source strings changed in %d components, fetching the pending units of %d translations",
+                        len(changed_components), len(source_changed))
+
+        units: List[Dict[str, Any]] = []
+        for pending_units in executor.map(fetch_pending_units, source_changed):
+            if pending_units is None:
+                success = False
+                continue
+            units.extend(pending_units)
+
+        for fetched, unit in executor.map(lambda url: fetch_object(weblate.get_unit, url), unit_urls):
+            success = success and fetched
+            if unit:
+                units.append(unit)
+
+    units_by_translation: Dict[str, List[Dict[str, Any]]] = {}
+    seen_unit_urls = set()
+    for unit in units:
+        if unit_needs_translation(unit) and unit['translation'] in translations and unit['url'] not in seen_unit_urls:
+            seen_unit_urls.add(unit['url'])
+            units_by_translation.setdefault(unit['translation'], []).append(unit)
+
+    jobs = []
+    for translation_url, translation_units in units_by_translation.items():
+        translation = translations[translation_url]
+        jobs.append(
+            Job(
+                target=translate_units,
+                name=job_name(translation),
+                kwargs={
+                    'translation': translation,
+                    'units': translation_units,
+                    'translator_kwargs': translator_kwargs,
+                    'patch_concurrency': args.patch_concurrency,
+                }
+            ))
+
+    logger.info("Running %d incremental translation jobs on %d workers", len(jobs), args.workers)
+    return all(run_jobs(jobs, args.workers)) and success
@@ -1,13 +1,21 @@
+import contextvars
 import logging
 import threading
 
+# Set by asyncio tasks, which all share one thread, to label their log records
+translation_task_name: contextvars.ContextVar = contextvars.ContextVar('translation_task_name', default=None)
+
+
+def current_task_name() -> str:
+    return translation_task_name.get() or threading.current_thread().name
+
 #-------------------------Setup logging-------------------------
 class ThreadInfoFilter(logging.Filter):
     """
     Log filter to add thread information to log records.
     """
     def filter(self, record):
-        thread_name = threading.current_thread().name
+        thread_name = current_task_name()
         record.translation_thread_name = thread_name
         parts = thread_name.split(' ')
         if len(parts) == 4:
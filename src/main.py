@@ -1,18 +1,38 @@
 import argparse
+import asyncio
 import json
 import logging
 import logging.config
-import os
 import threading
-import time
-from typing import Optional, Tuple
-
-import wlc
-from polib import POFile
-from wlc import Translation
-
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+from typing import Any, Dict, List, Optional, Tuple, Union
+
+import polib
+from polib import POEntry, POFile
+
+import metrics
+import openai_client
+import timing
+import weblate_client
+from async_pipeline import main_async
+from batch_api import BatchTranslator
+from batching import ALL_MODELS
+from file_transfer import (
+    TRANSLATE_ATTEMPTS, TRANSLATE_PAUSE_SECONDS, download_translation, record_finished, upload_translation)
+from incremental import load_watermark, save_watermark, translate_changes, utc_now
 from log_config import LOGGING_CONFIG
-from translator import Translator
+from model_routing import ModelRouter
+from pipeline import Finished, Stage, run_pipeline
+from po_stream import translate_streamed
+from rate_limit import rate_limiters
+from retry import retry_call
+from scheduler import Job, run_jobs
+from selection import filter_pending, job_name, list_selected_translations
+from translation_memory import TranslationMemory
+from translator import Translator, select_messages_to_translate
+from units import translate_translation_units
+from weblate_client import close_weblate_client, get_weblate_client
 
 # Apply the logging configuration
 logging.config.dictConfig(LOGGING_CONFIG)
@@ -20,11 +40,16 @@ logging.config.dictConfig(LOGGING_CONFIG)
 logger = logging.getLogger(__name__)
 
 
-def get_weblate_wrapper():
-    return wlc.Weblate(
-        key=os.environ.get('WEBLATE_API_KEY'),
-        url=os.environ.get('WEBLATE_API_URL')
-    )
+def token_budgets(value: str) -> Dict[str, int]:
+    # "6000" applies to every model, "gpt-4=6000,gpt-4o-mini=60000" sets budgets per model
+    budgets = {}
+    for part in value.split(','):
+        model, _, tokens = part.strip().rpartition('=')
+        try:
+            budgets[model.strip() or ALL_MODELS] = int(tokens)
+        except ValueError:
+            raise argparse.ArgumentTypeError(f"invalid token budget {part!r}, expected TOKENS or MODEL=TOKENS")
+    return budgets
 
 
 def parse_arguments():
@@ -35,195 +60,455 @@ def parse_arguments():
     parser.add_argument('--project', type=str, help='Project slug', required=True)
     parser.add_argument('--components', type=str, help='Component slug', nargs='+', default=None, required=False)
     parser.add_argument('--languages', type=str, help='Language code', nargs='+', default=None, required=False)
+    parser.add_argument('--workers', type=int, help='Number of translations processed concurrently, or translated concurrently in the download/translate/upload pipeline', default=3, required=False)
+    parser.add_argument('--download-workers', type=int, help='Number of translation files downloaded concurrently', default=2, required=False)
+    parser.add_argument('--upload-workers', type=int, help='Number of translation files uploaded concurrently', default=2, required=False)
+    parser.add_argument('--queue-size', type=int, help='Files waiting between pipeline stages, defaults to --workers', default=None, required=False)
+    parser.add_argument('--batch-concurrency', type=int, help='Number of OpenAI requests sent concurrently for one translation file', default=1, required=False)
+    parser.add_argument('--token-budget', type=token_budgets, help='Tokens per OpenAI request (prompt and reply), as a number for every model or MODEL=TOKENS pairs separated by commas, defaults to the model context window', default=None, required=False)
+    parser.add_argument('--requests-per-minute', type=int, help='OpenAI request quota, read from the response headers by default', default=None, required=False)
+    parser.add_argument('--tokens-per-minute', type=int, help='OpenAI token quota, read from the response headers by default', default=None, required=False)
+    parser.add_argument('--openai-max-connections', type=int, help='Size of the connection pool shared by all OpenAI requests', default=None, required=False)
+    parser.add_argument('--translation-memory', type=str, help='SQLite file used to remember and reuse translations', default=None, required=False)
+    parser.add_argument('--include-complete', action='store_true', help='Also download translations Weblate reports as fully translated')
+    parser.add_argument('--dedup', action='store_true', help='Translate all components of a language together, sending each distinct string once')
+    parser.add_argument('--weblate-max-connections', type=int, help='Size of the connection pool shared by all Weblate requests', default=None, required=False)
+    parser.add_argument('--units', action='store_true', help='Fetch and update individual units through the units API instead of whole files')
+    parser.add_argument('--patch-concurrency', type=int, help='Number of unit updates sent to Weblate concurrently', default=8, required=False)
+    parser.add_argument('--stream', action='store_true', help='Stream PO files to disk and splice translations back instead of parsing whole files in memory')
+    parser.add_argument('--since', type=str, help='Only translate units changed since this ISO 8601 timestamp', default=None, required=False)
+    parser.add_argument('--incremental', action='store_true', help='Only translate units changed since the last successful run recorded in --state-file')
+    parser.add_argument('--state-file', type=str, help='File recording the last successful run per project', default='translator_state.json', required=False)
+    parser.add_argument('--async', dest='use_async', action='store_true', help='Run all translations on one asyncio event loop')
+    parser.add_argument('--no-structured-output', dest='structured_output', action='store_false', help='Ask for a plain json reply instead of a schema-checked tool call, for models without tool support')
+    parser.add_argument('--model-rules', type=str, help='JSON file of rules choosing the OpenAI model per batch by string length, placeholders, markup and language', default=None, required=False)
+    parser.add_argument('--stream-completions', action='store_true', help='Stream OpenAI replies and apply each translation as soon as it arrives')
+    parser.add_argument('--batch-api', action='store_true', help='Translate everything in one OpenAI batch job, at lower cost and without per-minute rate limits')
+    parser.add_argument('--batch-poll-interval', type=float, help='Seconds between status checks of the batch job', default=60, required=False)
+    parser.add_argument('--batch-file', type=str, help='Where to write the JSONL file of batch requests, defaults to a temporary file', default=None, required=False)
+    parser.add_argument('--metrics-port', type=int, help='Serve Prometheus metrics on this port at /metrics', default=None, required=False)
+    parser.add_argument('--metrics-file', type=str, help='Write Prometheus metrics to this file for the node_exporter textfile collector', default=None, required=False)
+    parser.add_argument('--summary-file', type=str, help='Write the JSON run summary to this file', default=None, required=False)
 
     # Parse the command line arguments
-    return parser.parse_args()
-
-
-def download_translation(translation_url: str) -> Tuple[Optional[Translation], Optional[str]]:
-    # Returns po file contents as string
-    ATTEMPTS = 3
-    PAUSE_SECONDS = 60
-
-    for i in range(0, ATTEMPTS):
-        try:
-            logger.info('Attempting to download translation file for %s (Attempt %d/%d)', translation_url, i+1, ATTEMPTS)
-            weblate = get_weblate_wrapper()
-            translation = Translation(weblate, translation_url)
-            file = translation.download(convert='po')
-            file_contents = file.decode('utf-8')
-            logger.info('Successfully downloaded translation file for %s', translation_url)
-            return translation, file_contents
-        except Exception as e:
-            logger.exception("Failed to download translation file for %s: %s", translation_url, str(e))
-            if i < ATTEMPTS - 1:
-                logger.warning('Pausing for %d seconds before retry %d/%d', PAUSE_SECONDS, i+2, ATTEMPTS)
-                time.sleep(PAUSE_SECONDS)
-                continue
-
-            logger.error('All attempts to download translation file for %s have failed', translation_url)
-            return None, None
-
+    args = parser.parse_args()
+    check_mode_options(parser, args)
+    return args
+
+
+# Each mode option and the modes that do not support it
+UNSUPPORTED_COMBINATIONS = [
+    ('--units', ['--async', '--batch-api', '--since', '--incremental']),
+    ('--stream', ['--units', '--dedup', '--async', '--batch-api', '--since', '--incremental']),
+    ('--dedup', ['--async', '--since', '--incremental']),
+    ('--async', ['--batch-api', '--since', '--incremental']),
+    ('--batch-api', ['--since', '--incremental']),
+]
+
+
+def check_mode_options(parser: argparse.ArgumentParser, args):
+    # Rejects combinations where one mode would silently ignore the other
+    given = {
+        '--units': args.units,
+        '--stream': args.stream,
+        '--dedup': args.dedup,
+        '--async': args.use_async,
+        '--batch-api': args.batch_api,
+        '--since': bool(args.since),
+        '--incremental': args.incremental,
+    }
+    for option, modes in UNSUPPORTED_COMBINATIONS:
+        for mode in modes:
+            if given[option] and given[mode]:
+                parser.error(f"{option} cannot be combined with {mode}")
+
+
+def perform_translations(
+        po_file_contents: str,
+        language_code: str,
+        translator_kwargs: Optional[Dict[str, Any]] = None) -> Tuple[Optional[POFile], int]:
+    def translate() -> Tuple[POFile, int]:
+        translator = Translator(**(translator_kwargs or {}))
+        translated_po, translated_count = translator.tanslate_po_file(po_file_contents, language_code)
+        logger.info('Successfully performed %d translations for %s', translated_count, language_code)
+        return translated_po, translated_count
+
+    result = retry_call(
+        translate, f'perform translations for {language_code}', 'translate',
+        TRANSLATE_ATTEMPTS, TRANSLATE_PAUSE_SECONDS)
+    return result or (None, 0)
+
+
+def perform_shared_translations(
+        po_files_contents: List[str],
+        language_code: str,
+        translator_kwargs: Optional[Dict[str, Any]] = None) -> Optional[List[Tuple[POFile, int]]]:
+    def translate() -> List[Tuple[POFile, int]]:
+        translator = Translator(**(translator_kwargs or {}))
+        results = translator.translate_po_files(po_files_contents, language_code)
+        logger.info('Successfully performed %d translations for %s', sum(count for _, count in results), language_code)
+        return results
+
+    return retry_call(
+        translate, f'perform translations of {len(po_files_contents)} files for {language_code}', 'translate',
+        TRANSLATE_ATTEMPTS, TRANSLATE_PAUSE_SECONDS)
+
+
+def translate_language(
+        translations: List[Dict[str, Any]],
+        translator_kwargs: Optional[Dict[str, Any]] = None,
+        download_workers: int = 2,
+        upload_workers: int = 2) -> bool:
+    # Translates all selected components of one language together so shared strings are sent once
+    logger.info('Starting shared translation process for %d translations', len(translations))
+
+    # Keep the job's thread name so log records still carry project/language
+    parent_thread_name = threading.current_thread().name
+
+    def download(translation: Dict[str, Any]) -> Optional[str]:
+        threading.current_thread().name = parent_thread_name
+        return download_translation(translation)
+
+    with ThreadPoolExecutor(max_workers=max(1, download_workers)) as executor:
+        contents = list(executor.map(download, translations))
+
+    success = True
+    downloaded_translations = []
+    downloaded_contents = []
+    for translation, file_contents in zip(translations, contents):
+        if not file_contents:
+            logger.error('Failed to download translation file for %s. Skipping it.', translation['url'])
+            success = False
+            continue
 
-def upload_translation(
-        translation_url: str,
-        translated_po: POFile):
-    ATTEMPTS = 5
-    PAUSE_SECONDS = 120
+        downloaded_translations.append(translation)
+        downloaded_contents.append(file_contents)
 
-    for i in range(0, ATTEMPTS):
-        try:
-            logger.info('Attempting to upload translation file for %s (Attempt %d/%d)', translation_url, i+1, ATTEMPTS)
+    if not downloaded_contents:
+        logger.error('No translation files could be downloaded. Aborting translation.')
+        return False
 
-            weblate = get_weblate_wrapper()
-            translation = Translation(weblate, translation_url)
-            file_type = translation['filename'].split('.')[-1]
+    language = f"{translations[0]['language_code']}-{translations[0]['language']['name']}"
+    logger.info('Translating for language: %s', language)
+    results = perform_shared_translations(downloaded_contents, language, translator_kwargs)
+    if results is None:
+        logger.error('Failed to translate files for %s. Aborting translation.', language)
+        return False
 
-            if file_type == 'po':
-                contents = translated_po.__unicode__()
-            elif file_type == 'arb':
-                contents = json.dumps({msg.msgctxt: msg.msgstr for msg in translated_po if msg.msgstr != ''})
-            else:
-                logger.error("Unsupported file type %s", file_type)
-                raise ValueError(f"Unsupported file type {file_type}")
-
-            upload_result = translation.upload(
-                file=contents,
-                overwrite=False,
-                method='translate')
-
-            logger.info('Committing translation file for %s', translation_url)
-            translation.commit()
-
-            logger.info('Pushing translation file for %s', translation_url)
-            translation.push()
-
-            logger.info('Successfully uploaded translations for %s', translation_url)
-            return upload_result
-        except Exception as e:
-            logger.exception("Failed to upload translation file for %s: %s", translation_url, str(e))
-            if i < ATTEMPTS - 1:
-                logger.warning('Pausing for %d seconds before retry %d/%d', PAUSE_SECONDS, i+2, ATTEMPTS)
-                time.sleep(PAUSE_SECONDS)
-                continue
+    def upload(translated: Tuple[Dict[str, Any], Tuple[POFile, int]]) -> bool:
+        threading.current_thread().name = parent_thread_name
+        translation, (translated_po, translated_count) = translated
+        translation_url = translation['url']
+        if translated_count == 0:
+            logger.info('No new translations found for %s', translation_url)
+            return True
 
-            logger.error('All attempts to upload translation file for %s have failed', translation_url)
-            return None
+        logger.info('Found %d new translations for %s', translated_count, translation_url)
+        return upload_stage(translation, (translated_po, translated_count))
 
+    with ThreadPoolExecutor(max_workers=max(1, upload_workers)) as executor:
+        uploaded = list(executor.map(upload, zip(downloaded_translations, results)))
 
-def perform_translations(po_file_contents: str, language_code: str) -> Tuple[Optional[POFile], int]:
-    ATTEMPTS = 3
-    PAUSE_SECONDS = 120
+    return success and all(uploaded)
 
-    for i in range(0, ATTEMPTS):
-        try:
-            logger.info('Attempting to perform translations for %s (Attempt %d/%d)', language_code, i+1, ATTEMPTS)
-            translator = Translator()
-            translated_po, translated_count = translator.tanslate_po_file(po_file_contents, language_code)
-            logger.info('Successfully performed %d translations for %s', translated_count, language_code)
-            return translated_po, translated_count
-        except Exception as e:
-            logger.exception("Translation failed for %s: %s", language_code, str(e))
-            if i < ATTEMPTS - 1:
-                logger.warning('Pausing for %d seconds before retry %d/%d', PAUSE_SECONDS, i+2, ATTEMPTS)
-                time.sleep(PAUSE_SECONDS)
-                continue
 
-            logger.error('All attempts to perform translations for %s have failed', language_code)
-            return None, 0
-
-
-def translate(translation_url: str):
+def download_stage(translation: Dict[str, Any], _: Any) -> Union[str, Finished]:
+    translation_url = translation['url']
     logger.info('Starting translation process for %s', translation_url)
 
-    translation, file_contents = download_translation(translation_url)
-    if not translation or not file_contents:
+    file_contents = download_translation(translation)
+    if not file_contents:
         logger.error('Failed to download translation file for %s. Aborting translation.', translation_url)
-        return
+        return Finished(False)
+
+    return file_contents
+
 
+def translate_stage(
+        translation: Dict[str, Any],
+        file_contents: str,
+        translator_kwargs: Optional[Dict[str, Any]] = None) -> Union[Tuple[POFile, int], Finished]:
+    translation_url = translation['url']
     language_code = translation['language_code']
     language_name = translation['language']['name']
     logger.info('Translating for language: %s-%s', language_code, language_name)
-    translated_po, translated_count = perform_translations(file_contents, f'{language_code}-{language_name}')
+    translated_po, translated_count = perform_translations(
+        file_contents, f'{language_code}-{language_name}', translator_kwargs)
 
     if not translated_po:
         logger.error('Failed to translate file for %s. Aborting translation.', translation_url)
-        return
+        return Finished(False)
 
     if translated_count == 0:
         logger.info('No new translations found for %s - translation process complete.', translation_url)
-        return
+        return Finished(True)
 
     logger.info('Found %d new translations for %s', translated_count, translation_url)
+    return translated_po, translated_count
 
-    upload_result = upload_translation(translation_url, translated_po)
+
+def upload_stage(translation: Dict[str, Any], translated: Tuple[POFile, int]) -> bool:
+    translation_url = translation['url']
+    translated_po, translated_count = translated
+
+    upload_result = upload_translation(translation, translated_po)
 
     if not upload_result:
         logger.error('Failed to upload translation file for %s', translation_url)
-        return
+        return False
 
-    logger.info('Translation process finished successfully', extra={
-        'translation_url': translation_url,
-        'status': 'success',
-        'action': 'translate',
-        'translated_count': translated_count
-    })
+    record_finished(translation_url, translated_count)
 
-def main():
-    # Parse the arguments
-    args = parse_arguments()
-    args.project = args.project.lower()
-    args.components = [c.lower() for c in args.components] if args.components else None
-    args.languages = [lang.lower() for lang in args.languages] if args.languages else None
+    return True
 
+
+def translate_pipelined(args, translations: List[Dict[str, Any]], translator_kwargs: Dict[str, Any]) -> List[Optional[bool]]:
+    """
+    Downloads, translates and uploads the translations in separate stages, so Weblate
+    transfers of some files overlap with the OpenAI requests of others.
+    """
+    stages = [
+        Stage('download', download_stage, args.download_workers),
+        Stage('translate', partial(translate_stage, translator_kwargs=translator_kwargs), args.workers),
+        Stage('upload', upload_stage, args.upload_workers),
+    ]
+    queue_size = args.queue_size or args.workers
     logger.info(
-        "Starting translation process for project '%s'%s%s",
-        args.project,
-        f" with component filters {args.components}" if args.components else "",
-        f" and language filters {args.languages}" if args.languages else ""
-    )
-    weblate = get_weblate_wrapper()
-    translation_threads = []
-    for translation in weblate.list_translations():
-        component = translation['component']
-        component_id = component['slug'].lower()
-        project = component['project']
-        project_id = project['slug'].lower()
-        language_code = translation['language_code'].lower()
-
-        if project_id != args.project:
+        "Running %d translations through the pipeline with %d download, %d translate and %d upload workers",
+        len(translations), args.download_workers, args.workers, args.upload_workers)
+    return run_pipeline(translations, stages, queue_size, name=job_name)
+
+
+def main_threaded(args, translator_kwargs: Dict[str, Any]) -> bool:
+    weblate = get_weblate_client()
+    translation_jobs = []
+    pipelined_translations = []
+    translations_by_language: Dict[str, List[Dict[str, Any]]] = {}
+    translations = list_selected_translations(weblate, args.project, args.components, args.languages, args.workers)
+    if not args.include_complete:
+        translations = filter_pending(translations)
+
+    for translation in translations:
+        if args.dedup:
+            translations_by_language.setdefault(translation['language_code'].lower(), []).append(translation)
+            continue
+
+        name = job_name(translation)
+        logger.info('Queueing translation job %s', name)
+        if args.units:
+            translation_jobs.append(
+                Job(
+                    target=translate_translation_units,
+                    name=name,
+                    kwargs={
+                        'translations': [translation],
+                        'translator_kwargs': translator_kwargs,
+                        'patch_concurrency': args.patch_concurrency,
+                    }
+                ))
             continue
 
-        if args.components and component_id not in args.components or component_id == 'glossary':
+        # Only PO files can be spliced, other formats are rendered from a full parse
+        if not (args.stream and translation['filename'].endswith('.po')):
+            pipelined_translations.append(translation)
             continue
 
-        if args.languages and language_code not in args.languages:
+        translation_jobs.append(
+            Job(
+                target=translate_streamed,
+                name=name,
+                kwargs={
+                    'translation': translation,
+                    'translator_kwargs': translator_kwargs,
+                }
+            ))
+
+    for language_code, language_translations in translations_by_language.items():
+        name = f"TranslationThread {args.project} all {language_code}"
+        logger.info('Queueing shared translation job %s for %d components', name, len(language_translations))
+        if args.units:
+            translation_jobs.append(
+                Job(
+                    target=translate_translation_units,
+                    name=name,
+                    kwargs={
+                        'translations': language_translations,
+                        'translator_kwargs': translator_kwargs,
+                        'patch_concurrency': args.patch_concurrency,
+                    }
+                ))
             continue
 
-        logger.info('Creating translation thread for project: %s, component: %s, language: %s', project_id, component_id, language_code)
-        translation_threads.append(
-            threading.Thread(
-                target=translate,
-                name=f"TranslationThread {project_id} {component_id} {language_code}",
+        translation_jobs.append(
+            Job(
+                target=translate_language,
+                name=name,
                 kwargs={
-                    'translation_url': translation['url']
+                    'translations': language_translations,
+                    'translator_kwargs': translator_kwargs,
+                    'download_workers': args.download_workers,
+                    'upload_workers': args.upload_workers,
                 }
             ))
 
-    logger.info("Starting %d translation threads", len(translation_threads))
+    results: List[Optional[bool]] = []
+    if pipelined_translations:
+        results.extend(translate_pipelined(args, pipelined_translations, translator_kwargs))
+
+    if translation_jobs:
+        logger.info("Running %d translation jobs on %d workers", len(translation_jobs), args.workers)
+        results.extend(run_jobs(translation_jobs, args.workers))
+    return all(results)
+
+
+def main_batch_api(args, translator_kwargs: Dict[str, Any]) -> bool:
+    """
+    Translates every selected file through one OpenAI batch job instead of interactive requests.
+    Messages the batch job could not translate are retried with interactive requests.
+    """
+    weblate = get_weblate_client()
+    translations = list_selected_translations(weblate, args.project, args.components, args.languages, args.workers)
+    if not args.include_complete:
+        translations = filter_pending(translations)
+
+    with ThreadPoolExecutor(max_workers=max(1, args.download_workers)) as executor:
+        contents = list(executor.map(download_translation, translations))
+
+    success = all(contents)
+    files: List[Tuple[Dict[str, Any], POFile, List[POEntry]]] = []
+    entries_by_language: Dict[str, List[POEntry]] = {}
+    for translation, file_contents in zip(translations, contents):
+        if not file_contents:
+            logger.error('Failed to download translation file for %s. Skipping it.', translation['url'])
+            continue
+
+        po = polib.pofile(file_contents)
+        messages = select_messages_to_translate(po)
+        if not messages:
+            logger.info('No new translations found for %s', translation['url'])
+            continue
+
+        language = f"{translation['language_code']}-{translation['language']['name']}"
+        entries_by_language.setdefault(language, []).extend(messages)
+        files.append((translation, po, messages))
+
+    if not files:
+        logger.info('Nothing to translate - translation process complete.')
+        return success
+
+    batch_translator = BatchTranslator(
+        memory=translator_kwargs.get('memory'),
+        token_budget=translator_kwargs.get('token_budget'),
+        poll_seconds=args.batch_poll_interval,
+        batch_file=args.batch_file,
+        structured_output=args.structured_output,
+        router=translator_kwargs.get('router'),
+    )
+    untranslated = batch_translator.translate_entries(entries_by_language)
+
+    if untranslated:
+        logger.info('Retrying %d messages left by the batch job with interactive requests', len(untranslated))
+        untranslated_ids = {id(entry) for entry in untranslated}
+        translator = Translator(**translator_kwargs)
+        untranslated = []
+        for language, entries in entries_by_language.items():
+            remaining = [entry for entry in entries if id(entry) in untranslated_ids]
+            if not remaining:
+                continue
+            try:
+                untranslated.extend(translator.translate_entries(remaining, language))
+            except Exception as e:
+                logger.exception("Translation failed for %s: %s", language, str(e))
+                untranslated.extend(remaining)
+
+    untranslated_ids = {id(entry) for entry in untranslated}
+
+    def upload(file: Tuple[Dict[str, Any], POFile, List[POEntry]]) -> bool:
+        translation, po, messages = file
+        threading.current_thread().name = job_name(translation)
+        translated_count = sum(1 for message in messages if id(message) not in untranslated_ids)
+        if translated_count == 0:
+            logger.error('No messages of %s could be translated', translation['url'])
+            return False
 
-    batch = 3
-    while translation_threads:
-        batch_threads = translation_threads[:batch]
-        translation_threads = translation_threads[batch:]
+        logger.info('Found %d new translations for %s', translated_count, translation['url'])
+        return upload_stage(translation, (po, translated_count))
 
-        for thread in batch_threads:
-            thread.start()
-            logger.debug("Started thread: %s", thread.name)
+    with ThreadPoolExecutor(max_workers=max(1, args.upload_workers)) as executor:
+        uploaded = list(executor.map(upload, files))
 
-        for thread in batch_threads:
-            thread.join()
-            logger.debug("Completed thread: %s", thread.name)
+    return success and all(uploaded)
+
+
+def main():
+    # Parse the arguments
+    args = parse_arguments()
+    args.project = args.project.lower()
+    args.components = [c.lower() for c in args.components] if args.components else None
+    args.languages = [lang.lower() for lang in args.languages] if args.languages else None
+
+    logger.info(
+        "Starting translation process for project '%s'%s%s",
+        args.project,
+        f" with component filters {args.components}" if args.components else "",
+        f" and language filters {args.languages}" if args.languages else ""
+    )
+    openai_client.configure(max_connections=args.openai_max_connections)
+    weblate_client.configure(args.weblate_max_connections)
+    if args.requests_per_minute or args.tokens_per_minute:
+        rate_limiters.configure(args.requests_per_minute, args.tokens_per_minute)
+
+    memory = TranslationMemory(args.translation_memory) if args.translation_memory else None
+    translator_kwargs = {
+        'concurrency': args.batch_concurrency,
+        'memory': memory,
+        'token_budget': args.token_budget,
+        'structured_output': args.structured_output,
+        'stream_completions': args.stream_completions,
+        'router': ModelRouter.from_file(args.model_rules) if args.model_rules else None,
+    }
+
+    if args.metrics_port:
+        metrics.start_http_server(args.metrics_port)
+    metrics_writer = metrics.start_textfile_writer(args.metrics_file) if args.metrics_file else None
+
+    run_started = utc_now()
+    since = args.since
+    if not since and args.incremental:
+        since = load_watermark(args.state_file, args.project)
+        if not since:
+            logger.info("No previous run recorded in %s, translating everything", args.state_file)
+
+    try:
+        if since:
+            logger.info("Translating changes since %s", since)
+            success = translate_changes(args, translator_kwargs, since)
+        elif args.batch_api:
+            success = main_batch_api(args, translator_kwargs)
+        elif args.use_async:
+            success = asyncio.run(main_async(args, translator_kwargs))
+        else:
+            success = main_threaded(args, translator_kwargs)
+
+        if args.incremental:
+            if success:
+                save_watermark(args.state_file, args.project, run_started)
+            else:
+                logger.warning("Some translations failed, keeping the previous watermark")
+    finally:
+        if memory:
+            memory.close()
+        close_weblate_client()
+        if metrics_writer:
+            metrics_writer.set()
+            metrics.write_textfile(args.metrics_file)
+
+    report = timing.summary.report()
+    timing.log_summary(report)
+    print(json.dumps(report, indent=2))
+    if args.summary_file:
+        with open(args.summary_file, 'w') as file:
+            json.dump(report, file, indent=2)
 
     logger.info("All translation processes have finished")
 
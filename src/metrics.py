@@ -0,0 +1,209 @@
+import logging
+import os
+import tempfile
+import threading
+import time
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, Iterator, List, Sequence, Tuple, TypeVar
+
+logger = logging.getLogger(__name__)
+
+SECONDS_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300, 600)
+SIZE_BUCKETS = (1, 5, 10, 25, 50, 100, 250, 500)
+
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+MetricType = TypeVar('MetricType', bound='Metric')
+
+
+def format_value(value: float) -> str:
+    if value == float('inf'):
+        return '+Inf'
+    return repr(float(value)) if value != int(value) else str(int(value))
+
+
+def format_labels(names: Sequence[str], values: Sequence[str]) -> str:
+    if not names:
+        return ''
+    pairs = ','.join(
+        '{}="{}"'.format(name, str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n'))
+        for name, value in zip(names, values))
+    return '{' + pairs + '}'
+
+
+class Metric:
+    """
+    A metric family in the Prometheus text exposition format, one value per label combination.
+    """
+    kind = 'untyped'
+
+    def __init__(self, name: str, description: str, label_names: Sequence[str] = ()):
+        self.name = name
+        self.description = description
+        self.label_names = tuple(label_names)
+        self.lock = threading.Lock()
+        self.values: Dict[Tuple[str, ...], float] = {}
+
+    def label_values(self, labels: Dict[str, str]) -> Tuple[str, ...]:
+        if set(labels) != set(self.label_names):
+            raise ValueError(f"{self.name} expects labels {self.label_names}, got {tuple(labels)}")
+        return tuple(str(labels[name]) for name in self.label_names)
+
+    def samples(self) -> List[Tuple[str, str, float]]:
+        with self.lock:
+            return [(self.name, format_labels(self.label_names, key), value) for key, value in sorted(self.values.items())]
+
+    def render(self) -> str:
+        lines = [f'# HELP {self.name} {self.description}', f'# TYPE {self.name} {self.kind}']
+        lines.extend(f'{name}{labels} {format_value(value)}' for name, labels, value in self.samples())
+        return '\n'.join(lines) + '\n'
+
+
+class Counter(Metric):
+    kind = 'counter'
+
+    def inc(self, amount: float = 1, **labels: str):
+        key = self.label_values(labels)
+        with self.lock:
+            self.values[key] = self.values.get(key, 0) + amount
+
+
+class Gauge(Metric):
+    kind = 'gauge'
+
+    def set(self, value: float, **labels: str):
+        key = self.label_values(labels)
+        with self.lock:
+            self.values[key] = value
+
+    def inc(self, amount: float = 1, **labels: str):
+        key = self.label_values(labels)
+        with self.lock:
+            self.values[key] = self.values.get(key, 0) + amount
+
+    def dec(self, amount: float = 1, **labels: str):
+        self.inc(-amount, **labels)
+
+
+class Histogram(Metric):
+    kind = 'histogram'
+
+    def __init__(self, name: str, description: str, label_names: Sequence[str] = (), buckets: Sequence[float] = SECONDS_BUCKETS):
+        super().__init__(name, description, label_names)
+        self.buckets = tuple(sorted(buckets)) + (float('inf'),)
+        self.observations: Dict[Tuple[str, ...], Tuple[List[int], float]] = {}
+
+    def observe(self, value: float, **labels: str):
+        key = self.label_values(labels)
+        with self.lock:
+            counts, total = self.observations.get(key) or ([0] * len(self.buckets), 0.0)
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    counts[i] += 1
+            self.observations[key] = (counts, total + value)
+
+    @contextmanager
+    def time(self, **labels: str) -> Iterator[None]:
+        started = time.monotonic()
+        try:
+            yield
+        finally:
+            self.observe(time.monotonic() - started, **labels)
+
+    def samples(self) -> List[Tuple[str, str, float]]:
+        samples = []
+        with self.lock:
+            for key, (counts, total) in sorted(self.observations.items()):
+                for bound, count in zip(self.buckets, counts):
+                    labels = format_labels(self.label_names + ('le',), key + (format_value(bound),))
+                    samples.append((f'{self.name}_bucket', labels, count))
+                labels = format_labels(self.label_names, key)
+                samples.append((f'{self.name}_sum', labels, total))
+                samples.append((f'{self.name}_count', labels, counts[-1]))
+        return samples
+
+
+class Registry:
+    def __init__(self):
+        self.metrics: List[Metric] = []
+
+    def register(self, metric: MetricType) -> MetricType:
+        self.metrics.append(metric)
+        return metric
+
+    def render(self) -> str:
+        return ''.join(metric.render() for metric in self.metrics)
+
+
+registry = Registry()
+
+stage_duration = registry.register(Histogram(
+    'translator_stage_duration_seconds', 'Duration of one attempt at a download, translate or upload stage', ['stage']))
+openai_request_duration = registry.register(Histogram(
+    'translator_openai_request_duration_seconds', 'Duration of OpenAI chat completion requests'))
+openai_tokens = registry.register(Counter(
+    'translator_openai_tokens_total', 'OpenAI tokens reported in the response usage', ['direction']))
+openai_rate_limited = registry.register(Counter(
+    'translator_openai_rate_limited_total', 'OpenAI requests rejected with 429 Too Many Requests'))
+openai_requests_in_flight = registry.register(Gauge(
+    'translator_openai_requests_in_flight', 'OpenAI requests currently waiting for a reply'))
+batch_size = registry.register(Histogram(
+    'translator_batch_size', 'Messages sent in one OpenAI request', buckets=SIZE_BUCKETS))
+retries = registry.register(Counter(
+    'translator_retries_total', 'Retries scheduled after a failed attempt', ['stage']))
+queue_depth = registry.register(Gauge(
+    'translator_queue_depth', 'Work items waiting to be picked up', ['queue']))
+
+
+class MetricsHandler(BaseHTTPRequestHandler):
+    def log_message(self, format, *args):
+        logger.debug("Metrics request: " + format, *args)
+
+    def do_GET(self):
+        if self.path.split('?')[0] != '/metrics':
+            self.send_error(404)
+            return
+
+        payload = registry.render().encode('utf-8')
+        self.send_response(200)
+        self.send_header('Content-Type', CONTENT_TYPE)
+        self.send_header('Content-Length', str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+
+def start_http_server(port: int, address: str = '') -> ThreadingHTTPServer:
+    """
+    Serves the metrics on http://address:port/metrics from a daemon thread.
+    """
+    server = ThreadingHTTPServer((address, port), MetricsHandler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, name='MetricsServer', daemon=True).start()
+    logger.info("Serving metrics on port %d", server.server_address[1])
+    return server
+
+
+def write_textfile(path: str):
+    # Written to a temporary file first so the node_exporter textfile collector never reads half a file
+    directory = os.path.dirname(os.path.abspath(path))
+    with tempfile.NamedTemporaryFile('w', encoding='utf-8', dir=directory, suffix='.tmp', delete=False) as file:
+        file.write(registry.render())
+    os.replace(file.name, path)
+
+
+def start_textfile_writer(path: str, interval: float = 15.0) -> threading.Event:
+    """
+    Rewrites the metrics file every interval seconds until the returned event is set.
+    """
+    stopped = threading.Event()
+
+    def run():
+        while not stopped.wait(interval):
+            try:
+                write_textfile(path)
+            except Exception:
+                logger.exception("Failed to write metrics to %s", path)
+
+    threading.Thread(target=run, name='MetricsWriter', daemon=True).start()
+    return stopped
@@ -0,0 +1,174 @@
+import json
+import logging
+import re
+from typing import Any, Dict, List, Optional
+
+from polib import POEntry
+
+from batching import pack_batches
+
+logger = logging.getLogger(__name__)
+
+MODEL = "gpt-4"
+
+# printf style (%s, %d, %(name)s, %1$s) and brace style ({name}, {0}) placeholders
+PLACEHOLDER_PATTERN = re.compile(r'%(?:\d+\$|\([^)]+\))?[-+#0]*\d*(?:\.\d+)?[sdifeEgGxXoucr]|\{[^{}\s]*\}')
+# HTML or XML tags and character entities
+MARKUP_PATTERN = re.compile(r'</?[A-Za-z][^<>]*>|&(?:[A-Za-z]+|#\d+|#x[0-9A-Fa-f]+);')
+
+RULE_KEYS = ('model', 'languages', 'min_length', 'max_length', 'placeholders', 'markup')
+
+
+def source_texts(entry: POEntry) -> List[str]:
+    return [entry.msgid, entry.msgid_plural] if entry.msgid_plural else [entry.msgid]
+
+
+def has_placeholders(entry: POEntry) -> bool:
+    # Gettext marks format strings with flags such as python-format, no-python-format opts out
+    if any(flag.endswith('-format') and not flag.startswith('no-') for flag in entry.flags):
+        return True
+    return any(PLACEHOLDER_PATTERN.search(text) for text in source_texts(entry))
+
+
+def has_markup(entry: POEntry) -> bool:
+    return any(MARKUP_PATTERN.search(text) for text in source_texts(entry))
+
+
+def language_code(language: str) -> str:
+    # Translators get the language as "pt_BR-Portuguese (Brazil)". Weblate language codes separate
+    # their parts with underscores, so the code ends at the first hyphen.
+    return language.split('-', 1)[0]
+
+
+def normalize_code(code: str) -> str:
+    return code.lower().replace('-', '_')
+
+
+def language_matches(language: str, codes: List[str]) -> bool:
+    # A rule for "zh" also covers "zh_Hans", and "pt-BR" matches "pt_BR"
+    language = normalize_code(language_code(language))
+    return any(
+        language == code or language.startswith(code + '_') or language.startswith(code + '@')
+        for code in (normalize_code(code) for code in codes)
+    )
+
+
+def is_int(value: Any) -> bool:
+    return isinstance(value, int) and not isinstance(value, bool)
+
+
+class ModelRule:
+    """
+    Sends a message to a model when every condition that is set holds:
+    the code of the target language is one of languages, the longest source text has between
+    min_length and max_length characters, and the message has (or lacks) placeholders or markup.
+    """
+    def __init__(
+            self,
+            model: str,
+            languages: Optional[List[str]] = None,
+            min_length: Optional[int] = None,
+            max_length: Optional[int] = None,
+            placeholders: Optional[bool] = None,
+            markup: Optional[bool] = None):
+        self.model = model
+        self.languages = languages
+        self.min_length = min_length
+        self.max_length = max_length
+        self.placeholders = placeholders
+        self.markup = markup
+
+    @classmethod
+    def from_dict(cls, rule: Dict[str, Any]) -> 'ModelRule':
+        if not isinstance(rule, dict):
+            raise ValueError(f"Model rule is not an object: {rule}")
+        unknown = set(rule) - set(RULE_KEYS)
+        if unknown:
+            raise ValueError(f"Unknown keys in model rule: {', '.join(sorted(unknown))}")
+        if not isinstance(rule.get('model'), str) or not rule['model']:
+            raise ValueError(f"Model rule has no model: {rule}")
+
+        languages = rule.get('languages')
+        if languages is not None and (
+                not isinstance(languages, list) or not all(isinstance(code, str) and code for code in languages)):
+            raise ValueError(f"Model rule languages must be a list of language codes: {rule}")
+        for key in ('min_length', 'max_length'):
+            if key in rule and not (is_int(rule[key]) and rule[key] >= 0):
+                raise ValueError(f"Model rule {key} must be a whole number of characters: {rule}")
+        for key in ('placeholders', 'markup'):
+            if key in rule and not isinstance(rule[key], bool):
+                raise ValueError(f"Model rule {key} must be true or false: {rule}")
+        return cls(**rule)
+
+    def matches(self, entry: POEntry, language: str) -> bool:
+        if self.languages is not None and not language_matches(language, self.languages):
+            return False
+
+        length = max(len(text) for text in source_texts(entry))
+        if self.min_length is not None and length < self.min_length:
+            return False
+        if self.max_length is not None and length > self.max_length:
+            return False
+
+        if self.placeholders is not None and has_placeholders(entry) != self.placeholders:
+            return False
+        if self.markup is not None and has_markup(entry) != self.markup:
+            return False
+
+        return True
+
+
+class ModelRouter:
+    """
+    Chooses the model for each message from an ordered list of rules, the first matching rule wins.
+    Messages that match no rule go to the default model.
+    """
+    def __init__(self, rules: Optional[List[ModelRule]] = None, default_model: str = MODEL):
+        self.rules = rules or []
+        self.default_model = default_model
+
+    @classmethod
+    def from_file(cls, path: str) -> 'ModelRouter':
+        # {"default": "gpt-4", "rules": [{"model": "gpt-4o-mini", "max_length": 40, "markup": false}, ...]}
+        with open(path, encoding='utf-8') as file:
+            config = json.load(file)
+
+        if not isinstance(config, dict):
+            raise ValueError(f"Model rules file {path} must hold an object")
+        if not isinstance(config.get('rules', []), list):
+            raise ValueError(f"Model rules in {path} must be a list")
+        default_model = config.get('default', MODEL)
+        if not isinstance(default_model, str) or not default_model:
+            raise ValueError(f"Default model in {path} must be a model name")
+
+        rules = [ModelRule.from_dict(rule) for rule in config.get('rules', [])]
+        router = cls(rules, default_model)
+        logger.info("Loaded %d model rules from %s, default model %s", len(rules), path, router.default_model)
+        return router
+
+    def route_entry(self, entry: POEntry, language: str) -> str:
+        for rule in self.rules:
+            if rule.matches(entry, language):
+                return rule.model
+        return self.default_model
+
+    def route(self, batch: List[POEntry], language: str) -> str:
+        # Batches from pack() hold messages of one model only, mixed batches go to the default model
+        models = {self.route_entry(entry, language) for entry in batch}
+        return models.pop() if len(models) == 1 else self.default_model
+
+    def pack(self, entries: List[POEntry], language: str, budgets: Optional[Dict[str, int]] = None) -> List[List[POEntry]]:
+        # Groups the messages by model and packs each group within the budget of its model
+        entries_by_model: Dict[str, List[POEntry]] = {}
+        for entry in entries:
+            entries_by_model.setdefault(self.route_entry(entry, language), []).append(entry)
+
+        if len(entries_by_model) > 1:
+            logger.info("Routing messages: %s", ', '.join(
+                f"{len(model_entries)} to {model}" for model, model_entries in entries_by_model.items()))
+
+        return [
+            batch
+            for model, model_entries in entries_by_model.items()
+            for batch in pack_batches(model_entries, model, budgets)
+        ]
@@ -0,0 +1,88 @@
+import importlib.util
+import logging
+import os
+import threading
+from typing import Optional
+
+import httpx
+from openai import AsyncOpenAI, OpenAI
+
+logger = logging.getLogger(__name__)
+
+TIMEOUT_SECONDS = 60 * 5
+
+settings = {
+    'max_connections': 20,
+    'max_keepalive_connections': 20,
+    'keepalive_expiry': 60.0,
+    # httpx only speaks HTTP/2 when the h2 package is installed
+    'http2': importlib.util.find_spec('h2') is not None,
+}
+
+lock = threading.Lock()
+client: Optional[OpenAI] = None
+async_client: Optional[AsyncOpenAI] = None
+
+
+def configure(
+        max_connections: Optional[int] = None,
+        keepalive_expiry: Optional[float] = None,
+        http2: Optional[bool] = None):
+    # Must run before the first client is created
+    with lock:
+        if max_connections:
+            settings['max_connections'] = max_connections
+            settings['max_keepalive_connections'] = max_connections
+        if keepalive_expiry is not None:
+            settings['keepalive_expiry'] = keepalive_expiry
+        if http2 is not None:
+            settings['http2'] = http2 and importlib.util.find_spec('h2') is not None
+
+
+def build_limits() -> httpx.Limits:
+    return httpx.Limits(
+        max_connections=settings['max_connections'],
+        max_keepalive_connections=settings['max_keepalive_connections'],
+        keepalive_expiry=settings['keepalive_expiry'],
+    )
+
+
+def get_openai_client() -> OpenAI:
+    """
+    Returns the OpenAI client shared by every worker thread, so they all reuse one connection pool.
+    """
+    global client
+    with lock:
+        if client is None:
+            logger.info(
+                "Creating OpenAI client with up to %d connections%s",
+                settings['max_connections'], " over HTTP/2" if settings['http2'] else "")
+            client = OpenAI(
+                api_key=os.environ.get('OPENAI_KEY'),
+                timeout=TIMEOUT_SECONDS,
+                # Retries go through our own engine so they respect the shared rate limiter
+                max_retries=0,
+                http_client=httpx.Client(
+                    limits=build_limits(),
+                    http2=settings['http2'],
+                    timeout=TIMEOUT_SECONDS,
+                ),
+            )
+        return client
+
+
+def get_async_openai_client() -> AsyncOpenAI:
+    global async_client
+    with lock:
+        if async_client is None:
+            async_client = AsyncOpenAI(
+                api_key=os.environ.get('OPENAI_KEY'),
+                timeout=TIMEOUT_SECONDS,
+                max_retries=0,
+                http_client=httpx.AsyncClient(
+                    limits=build_limits(),
+                    http2=settings['http2'],
+                    timeout=TIMEOUT_SECONDS,
+                ),
+            )
+        return async_client
@@ -0,0 +1,100 @@
+import logging
+import queue
+import threading
+from typing import Any, Callable, List, NamedTuple, Optional
+
+import metrics
+
+logger = logging.getLogger(__name__)
+
+
+class Stage(NamedTuple):
+    name: str
+    # Called with the item and the value returned by the previous stage (None for the first stage).
+    # Returns the value for the next stage, or Finished to end the item here.
+    target: Callable[[Any, Any], Any]
+    workers: int
+
+
+class Finished(NamedTuple):
+    success: bool
+
+
+# Tells a worker that its stage has no more input
+STOP = object()
+
+
+def run_pipeline(
+        items: List[Any],
+        stages: List[Stage],
+        queue_size: int,
+        name: Callable[[Any], str] = str) -> List[Optional[bool]]:
+    """
+    Runs every item through the stages in order. Each stage has its own worker threads and
+    the queues between stages are bounded, so a slow stage holds back the ones before it
+    instead of piling up work in memory.
+    Returns the result of each item in order, None for items whose stage raised.
+    """
+    results: List[Optional[bool]] = [None] * len(items)
+    if not items or not stages:
+        return results
+
+    # The first queue holds only the items themselves and is not bounded
+    queues: List["queue.Queue[Any]"] = [queue.Queue()] + [queue.Queue(maxsize=max(1, queue_size)) for _ in stages[1:]]
+    for index, item in enumerate(items):
+        queues[0].put((index, item, None))
+    for _ in range(max(1, stages[0].workers)):
+        queues[0].put(STOP)
+
+    lock = threading.Lock()
+    running = [max(1, stage.workers) for stage in stages]
+
+    def worker(stage_index: int):
+        stage = stages[stage_index]
+        input_queue = queues[stage_index]
+        output_queue = queues[stage_index + 1] if stage_index + 1 < len(stages) else None
+
+        while True:
+            task: Any = input_queue.get()
+            metrics.queue_depth.set(input_queue.qsize(), queue=stage.name)
+            if task is STOP:
+                break
+
+            index, item, value = task
+            # The thread name carries project/component/language for ThreadInfoFilter
+            threading.current_thread().name = name(item)
+            logger.debug("Started %s stage of %s", stage.name, name(item))
+            try:
+                value = stage.target(item, value)
+            except Exception:
+                logger.exception("%s stage of %s failed", stage.name, name(item))
+                continue
+
+            if isinstance(value, Finished):
+                results[index] = value.success
+            elif output_queue is None:
+                results[index] = bool(value)
+            else:
+                output_queue.put((index, item, value))
+                metrics.queue_depth.set(output_queue.qsize(), queue=stages[stage_index + 1].name)
+
+        # The last worker of a stage closes the next one
+        with lock:
+            running[stage_index] -= 1
+            last = running[stage_index] == 0
+        if last and output_queue is not None:
+            for _ in range(max(1, stages[stage_index + 1].workers)):
+                output_queue.put(STOP)
+
+    threads = [
+        threading.Thread(target=worker, args=(stage_index,), name=f"{stage.name.capitalize()}Worker-{i}")
+        for stage_index, stage in enumerate(stages)
+        for i in range(max(1, stage.workers))
+    ]
+    for thread in threads:
+        thread.start()
+
+    for thread in threads:
+        thread.join()
+
+    return results
@@ -0,0 +1,166 @@
+import logging
+import re
+import tempfile
+from typing import Any, BinaryIO, Dict, Iterator, List, Optional, Tuple
+
+import polib
+from polib import POEntry
+
+import timing
+from file_transfer import (
+    DOWNLOAD_ATTEMPTS, DOWNLOAD_PAUSE_SECONDS, UPLOAD_ATTEMPTS, UPLOAD_PAUSE_SECONDS, publish, record_finished)
+from retry import retry_call
+from translator import Translator, needs_translation
+from weblate_client import get_weblate_client
+
+logger = logging.getLogger(__name__)
+
+# Downloads larger than this are kept on disk instead of in memory
+SPOOL_MAX_BYTES = 1024 * 1024
+
+# Blocks without an empty msgstr or a fuzzy flag are translated and never need parsing
+PENDING_HINT = re.compile(rb'^msgstr(?:\[\d+\])? ""\r?$|fuzzy', re.MULTILINE)
+
+
+def iter_blocks(file: BinaryIO) -> Iterator[Tuple[int, int, bytes]]:
+    # Yields (start, end, bytes) of every blank-line separated block of a PO file
+    file.seek(0)
+    start = offset = 0
+    lines: List[bytes] = []
+    for line in iter(file.readline, b''):
+        if line.strip() == b'':
+            if lines:
+                yield start, offset, b''.join(lines)
+                lines = []
+            offset += len(line)
+            start = offset
+            continue
+
+        lines.append(line)
+        offset += len(line)
+
+    if lines:
+        yield start, offset, b''.join(lines)
+
+
+def parse_block(block: bytes) -> Optional[POEntry]:
+    entries = [entry for entry in polib.pofile(block.decode('utf-8')) if not entry.obsolete]
+    if len(entries) != 1:
+        # The header and comment-only blocks carry no message
+        return None
+    return entries[0]
+
+
+class StreamedPOFile:
+    """
+    PO file kept in a file object, with only the entries that need translation parsed into memory.
+    Writing splices the translated entries back into the original bytes.
+    """
+    def __init__(self, file: BinaryIO):
+        self.file = file
+        self.pending: List[Tuple[int, int, POEntry]] = []
+        for start, end, block in iter_blocks(file):
+            # Cheap byte check first so translated blocks are never parsed
+            if not PENDING_HINT.search(block):
+                continue
+
+            entry = parse_block(block)
+            if entry is not None and needs_translation(entry):
+                self.pending.append((start, end, entry))
+
+    @property
+    def entries(self) -> List[POEntry]:
+        return [entry for _, _, entry in self.pending]
+
+    def write(self, out: BinaryIO, entries: List[POEntry]):
+        # Copies the original file, replacing the blocks of the given entries
+        replace_ids = {id(entry) for entry in entries}
+        self.file.seek(0)
+        offset = 0
+        for start, end, entry in self.pending:
+            if id(entry) not in replace_ids:
+                continue
+
+            copy_bytes(self.file, out, start - offset)
+            out.write((entry.__unicode__().rstrip('\n') + '\n').encode('utf-8'))
+            self.file.seek(end)
+            offset = end
+
+        copy_bytes(self.file, out, None)
+
+
+def copy_bytes(source: BinaryIO, target: BinaryIO, size: Optional[int], chunk_size: int = 64 * 1024):
+    while size is None or size > 0:
+        chunk = source.read(chunk_size if size is None else min(chunk_size, size))
+        if not chunk:
+            return
+        target.write(chunk)
+        if size is not None:
+            size -= len(chunk)
+
+
+def download_translation_file(translation: Dict[str, Any]) -> Optional[BinaryIO]:
+    translation_url = translation['url']
+
+    def download() -> BinaryIO:
+        file = tempfile.SpooledTemporaryFile(max_size=SPOOL_MAX_BYTES)
+        try:
+            with timing.span('download'):
+                get_weblate_client().download_translation_to(translation_url, file, file_format='po')
+        except Exception:
+            file.close()
+            raise
+        logger.info('Successfully downloaded translation file for %s', translation_url)
+        return file
+
+    return retry_call(
+        download, f'download translation file for {translation_url}', 'download',
+        DOWNLOAD_ATTEMPTS, DOWNLOAD_PAUSE_SECONDS)
+
+
+def upload_translation_file(translation: Dict[str, Any], file: BinaryIO) -> Optional[Dict[str, Any]]:
+    def upload() -> Dict[str, Any]:
+        file.seek(0)
+        return publish(get_weblate_client(), translation, file)
+
+    return retry_call(
+        upload, f"upload translation file for {translation['url']}", 'upload',
+        UPLOAD_ATTEMPTS, UPLOAD_PAUSE_SECONDS)
+
+
+def translate_streamed(translation: Dict[str, Any], translator_kwargs: Optional[Dict[str, Any]] = None) -> bool:
+    translation_url = translation['url']
+    logger.info('Starting streamed translation process for %s', translation_url)
+
+    file = download_translation_file(translation)
+    if file is None:
+        logger.error('Failed to download translation file for %s. Aborting translation.', translation_url)
+        return False
+
+    with file:
+        po = StreamedPOFile(file)
+        entries = po.entries
+        if not entries:
+            logger.info('No new translations found for %s - translation process complete.', translation_url)
+            return True
+
+        language = f"{translation['language_code']}-{translation['language']['name']}"
+        logger.info('Translating %d entries for language: %s', len(entries), language)
+        try:
+            untranslated = Translator(**(translator_kwargs or {})).translate_entries(entries, language)
+        except Exception as e:
+            logger.exception("Translation failed for %s: %s", translation_url, str(e))
+            return False
+
+        untranslated_ids = {id(entry) for entry in untranslated}
+        translated = [entry for entry in entries if id(entry) not in untranslated_ids]
+        logger.info('Found %d new translations for %s', len(translated), translation_url)
+
+        with tempfile.SpooledTemporaryFile(max_size=SPOOL_MAX_BYTES) as translated_file:
+            po.write(translated_file, translated)
+            if not upload_translation_file(translation, translated_file):
+                logger.error('Failed to upload translation file for %s', translation_url)
+                return False
+
+    record_finished(translation_url, len(translated))
+    return True
@@ -0,0 +1,176 @@
+import asyncio
+import logging
+import re
+import threading
+import time
+from typing import Dict, Mapping, Optional
+
+logger = logging.getLogger(__name__)
+
+DURATION_PATTERN = re.compile(r'(\d+(?:\.\d+)?)(ms|h|m|s)')
+DURATION_UNITS = {'h': 3600.0, 'm': 60.0, 's': 1.0, 'ms': 0.001}
+
+
+def parse_duration(value: Optional[str]) -> Optional[float]:
+    # OpenAI reports resets as "20ms", "1s" or "6m0s"
+    if not value:
+        return None
+
+    try:
+        return float(value)
+    except ValueError:
+        pass
+
+    parts = DURATION_PATTERN.findall(value)
+    if not parts:
+        return None
+    return sum(float(amount) * DURATION_UNITS[unit] for amount, unit in parts)
+
+
+def parse_int(value: Optional[str]) -> Optional[int]:
+    try:
+        return int(value) if value is not None else None
+    except ValueError:
+        return None
+
+
+class Bucket:
+    """
+    Token bucket refilled continuously at limit-per-minute. The level may go negative,
+    which reserves capacity for requests that are already waiting.
+    """
+    def __init__(self, limit: Optional[int] = None):
+        self.limit = limit
+        self.level = float(limit) if limit else 0.0
+        self.updated = time.monotonic()
+
+    def refill(self, now: float):
+        if self.limit:
+            self.level = min(float(self.limit), self.level + (now - self.updated) * self.limit / 60)
+        self.updated = now
+
+    def take(self, amount: float) -> float:
+        # Returns the seconds to wait until the taken amount is covered
+        if not self.limit:
+            return 0.0
+        self.level -= amount
+        return max(0.0, -self.level * 60 / self.limit)
+
+
+class RateLimiter:
+    """
+    Requests-per-minute and tokens-per-minute budget shared by every worker in the process.
+    Limits come from the x-ratelimit-* response headers unless set explicitly.
+    """
+    def __init__(
+            self,
+            requests_per_minute: Optional[int] = None,
+            tokens_per_minute: Optional[int] = None,
+            name: str = 'OpenAI'):
+        self.name = name
+        self.lock = threading.Lock()
+        self.requests = Bucket(requests_per_minute)
+        self.tokens = Bucket(tokens_per_minute)
+        self.fixed_limits = bool(requests_per_minute or tokens_per_minute)
+        self.blocked_until = 0.0
+
+    def configure(self, requests_per_minute: Optional[int] = None, tokens_per_minute: Optional[int] = None):
+        with self.lock:
+            self.requests = Bucket(requests_per_minute)
+            self.tokens = Bucket(tokens_per_minute)
+            self.fixed_limits = bool(requests_per_minute or tokens_per_minute)
+
+    def reserve(self, tokens: int) -> float:
+        # Takes one request and the given tokens from the budget and returns how long to wait before sending
+        with self.lock:
+            now = time.monotonic()
+            self.requests.refill(now)
+            self.tokens.refill(now)
+            wait = max(self.requests.take(1), self.tokens.take(tokens), self.blocked_until - now)
+        return wait
+
+    def acquire(self, tokens: int) -> float:
+        wait = self.reserve(tokens)
+        if wait > 0:
+            logger.debug("Rate limit reached, waiting %.1f seconds", wait)
+            time.sleep(wait)
+        return wait
+
+    async def acquire_async(self, tokens: int) -> float:
+        wait = self.reserve(tokens)
+        if wait > 0:
+            logger.debug("Rate limit reached, waiting %.1f seconds", wait)
+            await asyncio.sleep(wait)
+        return wait
+
+    def settle(self, reserved_tokens: int, used_tokens: Optional[int]):
+        # Gives back the part of the estimate the request did not use, or takes the excess
+        if used_tokens is None:
+            return
+        with self.lock:
+            if self.tokens.limit:
+                self.tokens.level += reserved_tokens - used_tokens
+
+    def update_from_headers(self, headers: Mapping[str, str]):
+        limit_requests = parse_int(headers.get('x-ratelimit-limit-requests'))
+        limit_tokens = parse_int(headers.get('x-ratelimit-limit-tokens'))
+        remaining_requests = parse_int(headers.get('x-ratelimit-remaining-requests'))
+        remaining_tokens = parse_int(headers.get('x-ratelimit-remaining-tokens'))
+
+        with self.lock:
+            now = time.monotonic()
+            if not self.fixed_limits:
+                for bucket, limit in ((self.requests, limit_requests), (self.tokens, limit_tokens)):
+                    if limit and bucket.limit != limit:
+                        if not bucket.limit:
+                            logger.info("Using %s rate limit of %d per minute from response headers", self.name, limit)
+                            bucket.level = float(limit)
+                        bucket.limit = limit
+
+            # The server's view is authoritative, but requests still in flight are not in it yet
+            for bucket, remaining in ((self.requests, remaining_requests), (self.tokens, remaining_tokens)):
+                if remaining is not None and bucket.limit:
+                    bucket.refill(now)
+                    bucket.level = min(bucket.level, float(remaining))
+
+    def block(self, headers: Optional[Mapping[str, str]] = None, default_seconds: float = 20.0):
+        # Called on a 429: stops every worker until the quota resets
+        seconds = None
+        if headers is not None:
+            seconds = (parse_duration(headers.get('retry-after'))
+                       or parse_duration(headers.get('x-ratelimit-reset-tokens'))
+                       or parse_duration(headers.get('x-ratelimit-reset-requests')))
+        seconds = seconds or default_seconds
+
+        with self.lock:
+            self.blocked_until = max(self.blocked_until, time.monotonic() + seconds)
+        logger.warning("%s rate limit hit, pausing all its requests for %.1f seconds", self.name, seconds)
+
+
+class ModelRateLimiters:
+    """
+    One RateLimiter per model, as OpenAI keeps separate quotas for each model
+    and reports the limits of the model that answered in the response headers.
+    """
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.limiters: Dict[str, RateLimiter] = {}
+        self.requests_per_minute: Optional[int] = None
+        self.tokens_per_minute: Optional[int] = None
+
+    def configure(self, requests_per_minute: Optional[int] = None, tokens_per_minute: Optional[int] = None):
+        # Explicit limits apply to every model
+        with self.lock:
+            self.requests_per_minute = requests_per_minute
+            self.tokens_per_minute = tokens_per_minute
+            for limiter in self.limiters.values():
+                limiter.configure(requests_per_minute, tokens_per_minute)
+
+    def get(self, model: str) -> RateLimiter:
+        with self.lock:
+            if model not in self.limiters:
+                self.limiters[model] = RateLimiter(self.requests_per_minute, self.tokens_per_minute, model)
+            return self.limiters[model]
+
+
+rate_limiters = ModelRateLimiters()
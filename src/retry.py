@@ -0,0 +1,75 @@
+import asyncio
+import logging
+import random
+import time
+from typing import Awaitable, Callable, Optional, TypeVar
+
+import timing
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar('T')
+
+MAX_ATTEMPTS = 6
+BACKOFF_BASE_SECONDS = 2.0
+BACKOFF_CAP_SECONDS = 120.0
+
+
+def backoff_delay(attempt: int, base: float = BACKOFF_BASE_SECONDS, cap: float = BACKOFF_CAP_SECONDS) -> float:
+    # Exponential backoff with full jitter, so parallel retries do not fire in lockstep
+    if attempt <= 0:
+        return 0.0
+    return random.uniform(0, min(cap, base * 2 ** (attempt - 1)))
+
+
+def retry_call(
+        action: Callable[[], T],
+        description: str,
+        stage: str,
+        attempts: int,
+        pause_seconds: float,
+        log_attempts: bool = True) -> Optional[T]:
+    """
+    Calls action until it returns, at most attempts times with a fixed pause in between.
+    Every pause is recorded as a retry of the stage. The description completes
+    "Attempting to ..." and "Failed to ..." in the log.
+    Returns the result of action, or None if every attempt raised.
+    """
+    for i in range(0, attempts):
+        try:
+            if log_attempts:
+                logger.info('Attempting to %s (Attempt %d/%d)', description, i+1, attempts)
+            return action()
+        except Exception as e:
+            logger.exception("Failed to %s: %s", description, str(e))
+            if i < attempts - 1:
+                timing.record_retry(stage, pause_seconds)
+                logger.warning('Pausing for %d seconds before retry %d/%d', pause_seconds, i+2, attempts)
+                time.sleep(pause_seconds)
+
+    logger.error('All attempts to %s have failed', description)
+    return None
+
+
+async def retry_call_async(
+        action: Callable[[], Awaitable[T]],
+        description: str,
+        stage: str,
+        attempts: int,
+        pause_seconds: float,
+        log_attempts: bool = True) -> Optional[T]:
+    # Same as retry_call for coroutines, pausing without blocking the event loop
+    for i in range(0, attempts):
+        try:
+            if log_attempts:
+                logger.info('Attempting to %s (Attempt %d/%d)', description, i+1, attempts)
+            return await action()
+        except Exception as e:
+            logger.exception("Failed to %s: %s", description, str(e))
+            if i < attempts - 1:
+                timing.record_retry(stage, pause_seconds)
+                logger.warning('Pausing for %d seconds before retry %d/%d', pause_seconds, i+2, attempts)
+                await asyncio.sleep(pause_seconds)
+
+    logger.error('All attempts to %s have failed', description)
+    return None
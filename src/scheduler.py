@@ -0,0 +1,59 @@
+import logging
+import queue
+import threading
+from typing import Any, Callable, Dict, List, NamedTuple, Tuple
+
+import metrics
+
+logger = logging.getLogger(__name__)
+
+
+class Job(NamedTuple):
+    name: str
+    target: Callable[..., Any]
+    kwargs: Dict[str, Any]
+
+
+def run_jobs(jobs: List[Job], workers: int) -> List[Any]:
+    """
+    Run jobs on a fixed-size pool of worker threads pulling from a shared queue.
+    A worker picks up the next job as soon as its current one finishes.
+    Returns the result of each job in order, None for jobs that raised.
+    """
+    results: List[Any] = [None] * len(jobs)
+    if not jobs:
+        return results
+
+    workers = max(1, min(workers, len(jobs)))
+    job_queue: "queue.Queue[Tuple[int, Job]]" = queue.Queue()
+    for index, job in enumerate(jobs):
+        job_queue.put((index, job))
+    metrics.queue_depth.set(job_queue.qsize(), queue='jobs')
+
+    def worker():
+        while True:
+            try:
+                index, job = job_queue.get_nowait()
+            except queue.Empty:
+                return
+            metrics.queue_depth.set(job_queue.qsize(), queue='jobs')
+
+            # The thread name carries project/component/language for ThreadInfoFilter
+            threading.current_thread().name = job.name
+            logger.debug("Started job: %s (%d queued)", job.name, job_queue.qsize())
+            try:
+                results[index] = job.target(**job.kwargs)
+            except Exception:
+                logger.exception("Job %s failed", job.name)
+            finally:
+                logger.debug("Completed job: %s", job.name)
+                job_queue.task_done()
+
+    threads = [threading.Thread(target=worker, name=f"TranslationWorker-{i}") for i in range(workers)]
+    for thread in threads:
+        thread.start()
+
+    for thread in threads:
+        thread.join()
+
+    return results
@@ -0,0 +1,123 @@
+import asyncio
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, List, Optional
+
+from weblate_client import AsyncWeblateClient, WeblateClient
+
+logger = logging.getLogger(__name__)
+
+
+def is_component_selected(component: Any, components: Optional[List[str]] = None) -> bool:
+    component_id = component['slug'].lower()
+    if component_id == 'glossary' or component.get('is_glossary'):
+        return False
+
+    return not components or component_id in components
+
+
+def is_selected(
+        translation: Any,
+        project: str,
+        components: Optional[List[str]] = None,
+        languages: Optional[List[str]] = None) -> bool:
+    component = translation['component']
+    component_id = component['slug'].lower()
+    project_id = component['project']['slug'].lower()
+    language_code = translation['language_code'].lower()
+
+    if project_id != project:
+        return False
+
+    if components and component_id not in components or component_id == 'glossary':
+        return False
+
+    if languages and language_code not in languages:
+        return False
+
+    return True
+
+
+def pending_strings(translation: Any) -> Optional[int]:
+    # Untranslated plus fuzzy strings, as Weblate counts neither as translated.
+    # None when the listing carries no statistics.
+    total = translation.get('total')
+    translated = translation.get('translated')
+    if total is None or translated is None:
+        return None
+
+    return max(0, total - translated)
+
+
+def filter_pending(translations: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    pending = []
+    for translation in translations:
+        count = pending_strings(translation)
+        if count == 0:
+            logger.debug("Skipping %s, Weblate reports nothing to translate", translation['url'])
+            continue
+        pending.append(translation)
+
+    logger.info("Skipping %d fully translated out of %d translations", len(translations) - len(pending), len(translations))
+    return pending
+
+
+def job_name(translation: Any) -> str:
+    component = translation['component']
+    component_id = component['slug'].lower()
+    project_id = component['project']['slug'].lower()
+    language_code = translation['language_code'].lower()
+    return f"TranslationThread {project_id} {component_id} {language_code}"
+
+
+def list_selected_translations(
+        weblate: WeblateClient,
+        project: str,
+        components: Optional[List[str]] = None,
+        languages: Optional[List[str]] = None,
+        workers: int = 8) -> List[Dict[str, Any]]:
+    """
+    Lists the translations of one project through its component endpoints,
+    fetching the translations of several components at once.
+    """
+    selected_components = [
+        component for component in weblate.list_components(project)
+        if is_component_selected(component, components)
+    ]
+    logger.info("Listing translations of %d components in project %s", len(selected_components), project)
+
+    with ThreadPoolExecutor(max_workers=max(1, workers)) as executor:
+        component_translations = list(executor.map(
+            lambda component: list(weblate.list_component_translations(component)),
+            selected_components))
+
+    return [
+        translation
+        for translations in component_translations
+        for translation in translations
+        if is_selected(translation, project, components, languages)
+    ]
+
+
+async def list_selected_translations_async(
+        weblate: AsyncWeblateClient,
+        project: str,
+        components: Optional[List[str]] = None,
+        languages: Optional[List[str]] = None) -> List[Dict[str, Any]]:
+    selected_components = [
+        component async for component in weblate.list_components(project)
+        if is_component_selected(component, components)
+    ]
+    logger.info("Listing translations of %d components in project %s", len(selected_components), project)
+
+    async def list_component(component: Dict[str, Any]) -> List[Dict[str, Any]]:
+        return [translation async for translation in weblate.list_component_translations(component)]
+
+    component_translations = await asyncio.gather(*[list_component(component) for component in selected_components])
+
+    return [
+        translation
+        for translations in component_translations
+        for translation in translations
+        if is_selected(translation, project, components, languages)
+    ]
@@ -0,0 +1,169 @@
+import logging
+import threading
+import time
+from contextlib import contextmanager
+from typing import Any, Dict, Iterator, Optional
+
+import metrics
+from log_config import current_task_name
+
+logger = logging.getLogger(__name__)
+
+JOB_NAME_PREFIX = 'TranslationThread '
+
+
+class StageTiming:
+    def __init__(self):
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    def add(self, seconds: float):
+        self.count += 1
+        self.total += seconds
+        self.max = max(self.max, seconds)
+
+    def as_dict(self) -> Dict[str, Any]:
+        return {'count': self.count, 'total_seconds': round(self.total, 3), 'max_seconds': round(self.max, 3)}
+
+
+class TranslationTiming:
+    """
+    Timings of one translation job, collected from every thread or task working on it.
+    """
+    def __init__(self):
+        self.stages: Dict[str, StageTiming] = {}
+        self.started: Optional[float] = None
+        self.finished: Optional[float] = None
+        self.retry_sleep = 0.0
+        self.rate_limit_wait = 0.0
+        self.strings = 0
+        self.tokens_in = 0
+        self.tokens_out = 0
+
+    def cover(self, started: float, finished: float):
+        self.started = started if self.started is None else min(self.started, started)
+        self.finished = finished if self.finished is None else max(self.finished, finished)
+
+    @property
+    def wall_time(self) -> float:
+        if self.started is None or self.finished is None:
+            return 0.0
+        return self.finished - self.started
+
+    def as_dict(self, wall_time: float) -> Dict[str, Any]:
+        tokens = self.tokens_in + self.tokens_out
+        return {
+            'wall_seconds': round(wall_time, 3),
+            'stages': {stage: timing.as_dict() for stage, timing in sorted(self.stages.items())},
+            'retry_sleep_seconds': round(self.retry_sleep, 3),
+            'rate_limit_wait_seconds': round(self.rate_limit_wait, 3),
+            'strings': self.strings,
+            'strings_per_second': round(self.strings / wall_time, 3) if wall_time else None,
+            'tokens_in': self.tokens_in,
+            'tokens_out': self.tokens_out,
+            'tokens_per_second': round(tokens / wall_time, 3) if wall_time else None,
+        }
+
+
+class RunSummary:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.started = time.monotonic()
+        self.translations: Dict[str, TranslationTiming] = {}
+
+    def current(self) -> TranslationTiming:
+        # Must be called with the lock held
+        name = current_task_name()
+        if name.startswith(JOB_NAME_PREFIX):
+            name = '/'.join(name[len(JOB_NAME_PREFIX):].split(' '))
+        if name not in self.translations:
+            self.translations[name] = TranslationTiming()
+        return self.translations[name]
+
+    def record_stage(self, stage: str, started: float, finished: float):
+        with self.lock:
+            timing = self.current()
+            timing.stages.setdefault(stage, StageTiming()).add(finished - started)
+            timing.cover(started, finished)
+
+    def record_retry_sleep(self, seconds: float):
+        with self.lock:
+            self.current().retry_sleep += seconds
+
+    def record_rate_limit_wait(self, seconds: float):
+        with self.lock:
+            self.current().rate_limit_wait += seconds
+
+    def record_strings(self, count: int):
+        with self.lock:
+            self.current().strings += count
+
+    def record_tokens(self, tokens_in: int, tokens_out: int):
+        with self.lock:
+            timing = self.current()
+            timing.tokens_in += tokens_in
+            timing.tokens_out += tokens_out
+
+    def report(self) -> Dict[str, Any]:
+        with self.lock:
+            wall_time = time.monotonic() - self.started
+            overall = TranslationTiming()
+            for timing in self.translations.values():
+                for stage, stage_timing in timing.stages.items():
+                    total = overall.stages.setdefault(stage, StageTiming())
+                    total.count += stage_timing.count
+                    total.total += stage_timing.total
+                    total.max = max(total.max, stage_timing.max)
+                overall.retry_sleep += timing.retry_sleep
+                overall.rate_limit_wait += timing.rate_limit_wait
+                overall.strings += timing.strings
+                overall.tokens_in += timing.tokens_in
+                overall.tokens_out += timing.tokens_out
+
+            return {
+                'overall': overall.as_dict(wall_time),
+                'translations': {
+                    name: timing.as_dict(timing.wall_time)
+                    for name, timing in sorted(self.translations.items())
+                },
+            }
+
+
+summary = RunSummary()
+
+
+@contextmanager
+def span(stage: str) -> Iterator[None]:
+    """
+    Times a stage of the current translation for the run summary and the stage duration histogram.
+    """
+    started = time.monotonic()
+    try:
+        yield
+    finally:
+        finished = time.monotonic()
+        metrics.stage_duration.observe(finished - started, stage=stage)
+        summary.record_stage(stage, started, finished)
+
+
+def record_retry(stage: str, sleep_seconds: float, count: int = 1):
+    metrics.retries.inc(count, stage=stage)
+    summary.record_retry_sleep(sleep_seconds)
+
+
+def log_summary(report: Dict[str, Any]):
+    for name, timing in report['translations'].items():
+        stages = ', '.join(
+            f"{stage} {stage_timing['total_seconds']:.1f}s/{stage_timing['count']}"
+            for stage, stage_timing in timing['stages'].items())
+        logger.info(
+            "%s: %d strings in %.1fs (%s), %.1fs sleeping in retries, %.1fs waiting for rate limits",
+            name, timing['strings'], timing['wall_seconds'], stages or 'no stages',
+            timing['retry_sleep_seconds'], timing['rate_limit_wait_seconds'])
+
+    overall = report['overall']
+    logger.info(
+        "Run finished in %.1fs: %d strings (%s/s), %d tokens in, %d tokens out (%s/s), %.1fs sleeping in retries",
+        overall['wall_seconds'], overall['strings'], overall['strings_per_second'],
+        overall['tokens_in'], overall['tokens_out'], overall['tokens_per_second'], overall['retry_sleep_seconds'])
@@ -0,0 +1,78 @@
+import json
+import logging
+import sqlite3
+import threading
+from typing import List
+
+from polib import POEntry
+
+logger = logging.getLogger(__name__)
+
+
+class TranslationMemory:
+    """
+    SQLite store of earlier translations keyed by (msgid, msgid_plural, msgctxt, language).
+    Safe to share between threads.
+    """
+    def __init__(self, path: str):
+        self.path = path
+        self.lock = threading.Lock()
+        self.connection = sqlite3.connect(path, check_same_thread=False)
+        with self.lock, self.connection:
+            self.connection.execute("""
+                CREATE TABLE IF NOT EXISTS translations (
+                    msgid TEXT NOT NULL,
+                    msgid_plural TEXT NOT NULL,
+                    msgctxt TEXT NOT NULL,
+                    language TEXT NOT NULL,
+                    msgstr TEXT NOT NULL,
+                    msgstr_plural TEXT NOT NULL,
+                    PRIMARY KEY (msgid, msgid_plural, msgctxt, language)
+                )
+            """)
+
+    @staticmethod
+    def key(entry: POEntry, language: str):
+        return entry.msgid, entry.msgid_plural or '', entry.msgctxt or '', language
+
+    def fill(self, entries: List[POEntry], language: str) -> List[POEntry]:
+        # Applies remembered translations and returns the entries that still need one
+        remaining = []
+        with self.lock:
+            for entry in entries:
+                row = self.connection.execute(
+                    "SELECT msgstr, msgstr_plural FROM translations"
+                    " WHERE msgid = ? AND msgid_plural = ? AND msgctxt = ? AND language = ?",
+                    self.key(entry, language)
+                ).fetchone()
+
+                if row is None:
+                    remaining.append(entry)
+                    continue
+
+                msgstr, msgstr_plural = row
+                if entry.msgid_plural:
+                    entry.msgstr_plural = json.loads(msgstr_plural)
+                else:
+                    entry.msgstr = msgstr
+                entry.fuzzy = False
+
+        if len(remaining) < len(entries):
+            logger.info("Translation memory provided %d out of %d messages", len(entries) - len(remaining), len(entries))
+
+        return remaining
+
+    def store(self, entries: List[POEntry], language: str):
+        with self.lock, self.connection:
+            self.connection.executemany(
+                "INSERT OR REPLACE INTO translations"
+                " (msgid, msgid_plural, msgctxt, language, msgstr, msgstr_plural) VALUES (?, ?, ?, ?, ?, ?)",
+                [
+                    self.key(entry, language) + (entry.msgstr, json.dumps(entry.msgstr_plural))
+                    for entry in entries
+                ]
+            )
+
+    def close(self):
+        with self.lock:
+            self.connection.close()
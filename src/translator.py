@@ -1,183 +1,775 @@
+import asyncio
+import heapq
+import itertools
 import json
 import logging
-import os
 import re
+import threading
 import time
-from typing import List, Optional, Tuple
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from contextlib import contextmanager
+from typing import Any, Dict, List, Optional, Set, Tuple
 
 import polib
-from openai import OpenAI
+from openai import AsyncOpenAI, OpenAI, RateLimitError
 from polib import POEntry, POFile
 
-logger = logging.getLogger(__name__)
+import metrics
+import timing
+from batching import estimate_prompt_tokens, max_completion_tokens
+from model_routing import MODEL, ModelRouter
+from openai_client import get_async_openai_client, get_openai_client
+from rate_limit import RateLimiter, rate_limiters
+from retry import MAX_ATTEMPTS, backoff_delay
+from translation_memory import TranslationMemory
 
+logger = logging.getLogger(__name__)
 
-class Translator:
+# Start of a json list of objects and the separator between its items
+LIST_START = re.compile(r'\[\s*\{')
+ITEM_SEPARATOR = re.compile(r'\s*,?\s*')
+
+# Forcing the reply through this tool makes the API return arguments that follow the schema
+TRANSLATIONS_TOOL = {
+    "type": "function",
+    "function": {
+        "name": "submit_translations",
+        "description": "Submit the translated messages",
+        "parameters": {
+            "type": "object",
+            "properties": {
+                "translations": {
+                    "type": "array",
+                    "items": {
+                        "type": "object",
+                        "properties": {
+                            "id": {"type": "integer", "description": "id of the source message"},
+                            "text": {"type": "string", "description": "translation of text"},
+                            "text_plural": {"type": "string", "description": "translation of text_plural, if given"},
+                        },
+                        "required": ["id", "text"],
+                    },
+                },
+            },
+            "required": ["translations"],
+        },
+    },
+}
+
+
+def needs_translation(entry: POEntry) -> bool:
+    # Obsolete (#~) entries are never translated or uploaded. translated() is False for
+    # fuzzy and empty entries, and for plural entries checks every form instead of msgstr.
+    return not entry.obsolete and not entry.translated()
+
+
+def select_messages_to_translate(po: POFile) -> List[POEntry]:
+    # A single pass with a per-entry predicate. Checking membership in
+    # po.untranslated_entries() compared whole entries and was quadratic.
+    return [message for message in po if needs_translation(message)]
+
+
+def source_key(entry: POEntry) -> Tuple[str, str, str]:
+    return entry.msgid, entry.msgid_plural or '', entry.msgctxt or ''
+
+
+def group_by_source(entries: List[POEntry]) -> Dict[Tuple[str, str, str], List[POEntry]]:
+    groups: Dict[Tuple[str, str, str], List[POEntry]] = {}
+    for entry in entries:
+        groups.setdefault(source_key(entry), []).append(entry)
+    return groups
+
+
+def copy_translation(source: POEntry, target: POEntry):
+    if source.msgid_plural:
+        target.msgstr_plural = dict(source.msgstr_plural)
+    else:
+        target.msgstr = source.msgstr
+    target.fuzzy = source.fuzzy
+
+
+def render_translation_file(po: POFile, file_type: str) -> str:
+    if file_type == 'po':
+        return po.__unicode__()
+    elif file_type == 'arb':
+        return json.dumps({msg.msgctxt: msg.msgstr for msg in po if msg.msgstr != ''})
+
+    logger.error("Unsupported file type %s", file_type)
+    raise ValueError(f"Unsupported file type {file_type}")
+
+
+def build_request(batch: List[POEntry], language: str, structured_output: bool = True, model: str = MODEL) -> Dict[str, Any]:
+    input_json = []
+    for i, entry in enumerate(batch):
+        input_data = {"id": i}
+
+        if entry.msgid_plural:
+            input_data.update({"text": entry.msgid, "text_plural": entry.msgid_plural})
+        else:
+            input_data["text"] = entry.msgid
+
+        input_json.append(input_data)
+    input_json_text = json.dumps(input_json)
+
+    if structured_output:
+        reply_instructions = "Call submit_translations with the translated messages, keeping the id of each message."
+    else:
+        reply_instructions = "Reply with the same json list, but with the translated messages."
+
+    prompt = f"""
+    I have a list of messages in english.
+    I need to translate them to {language}.
+
+    {reply_instructions}
+
+    {input_json_text}
+    """
+
+    request = {
+        "messages": [
+            {
+                "role": "user",
+                "content": prompt,
+            }
+        ],
+        "model": model,
+        "max_tokens": max_completion_tokens(batch, model),
+    }
+    if structured_output:
+        request["tools"] = [TRANSLATIONS_TOOL]
+        request["tool_choice"] = {"type": "function", "function": {"name": TRANSLATIONS_TOOL["function"]["name"]}}
+    else:
+        request["stop"] = ["\n\n\n"]
+    return request
+
+
+def apply_item(entry: POEntry, item: Dict[str, Any]) -> bool:
+    text = item.get('text')
+    if not isinstance(text, str):
+        return False
+
+    if not entry.msgid_plural:
+        entry.msgstr = text
+    else:
+        text_plural = item.get('text_plural')
+        if not isinstance(text_plural, str):
+            return False
+
+        entry.msgstr_plural = {
+            '0': text,
+            '1': text_plural
+        }
+
+    entry.fuzzy = False
+    return True
+
+
+def parse_tool_arguments(arguments: str) -> Optional[List[Any]]:
+    try:
+        data = json.loads(arguments)
+    except json.JSONDecodeError:
+        logger.warning("Could not load json from openai tool call: %s", arguments)
+        return None
+
+    items = data.get('translations') if isinstance(data, dict) else None
+    if not isinstance(items, list):
+        logger.warning("Openai tool call has no translations list: %s", arguments)
+        return None
+    return items
+
+
+def apply_structured_reply(batch: List[POEntry], content: Optional[str], arguments: Optional[str]) -> List[POEntry]:
+    # Prefers the tool call arguments and falls back to scraping a json list out of the text
+    if arguments is not None:
+        items = parse_tool_arguments(arguments)
+        if items is not None:
+            return apply_items(batch, items)
+
+    return apply_reply(batch, content or arguments or '')
+
+
+def message_reply(message: Any) -> Tuple[Optional[str], Optional[str]]:
+    # Returns the content and the tool call arguments of a chat completion message
+    arguments = message.tool_calls[0].function.arguments if message.tool_calls else None
+    return message.content, arguments
+
+
+class ItemStreamParser:
+    """
+    Incremental parser for the first json list of objects in a text that arrives in pieces.
+    Text around the list is ignored and every complete item is returned as soon as it is closed,
+    so a reply cut off mid-list still yields the items before the cut.
+    """
     def __init__(self):
-        self.openai = OpenAI(
-            api_key=os.environ.get('OPENAI_KEY'),
-            timeout=60 * 5,
+        self.buffer = ''
+        # Position after the last decoded item, None until the list starts
+        self.index: Optional[int] = None
+        self.finished = False
+        self.decoder = json.JSONDecoder()
+
+    def feed(self, text: str) -> List[Any]:
+        self.buffer += text
+        if self.finished:
+            return []
+
+        if self.index is None:
+            start = LIST_START.search(self.buffer)
+            if not start:
+                return []
+            self.index = start.start() + 1
+
+        items = []
+        while True:
+            index = ITEM_SEPARATOR.match(self.buffer, self.index).end()
+            if index >= len(self.buffer):
+                break
+            if self.buffer[index] == ']':
+                self.finished = True
+                break
+
+            try:
+                item, self.index = self.decoder.raw_decode(self.buffer, index)
+            except json.JSONDecodeError:
+                # The item is not complete yet
+                break
+            items.append(item)
+
+        return items
+
+
+def salvage_items(text: str) -> Optional[List[Any]]:
+    parser = ItemStreamParser()
+    items = parser.feed(text)
+    if parser.index is None:
+        return None
+
+    if not parser.finished:
+        logger.warning("Openai reply is cut off after %d items", len(items))
+    return items
+
+
+def parse_items(reply: str) -> Optional[List[Any]]:
+    try:
+        data = json.loads(reply)
+    except json.JSONDecodeError:
+        return salvage_items(reply)
+
+    if isinstance(data, dict):
+        data = data.get('translations')
+    return data if isinstance(data, list) else salvage_items(reply)
+
+
+def apply_reply(batch: List[POEntry], reply: str) -> List[POEntry]:
+    # Applies every valid item of the reply and returns the entries that are still untranslated
+    items = parse_items(reply)
+    if items is None:
+        logger.error("Could not parse openai reply: %s", reply)
+        return list(batch)
+
+    return apply_items(batch, items)
+
+
+def coerce_id(value: Any) -> Optional[int]:
+    # Models sometimes quote the ids or write them as floats
+    if isinstance(value, bool):
+        return None
+    if isinstance(value, int):
+        return value
+    if isinstance(value, float) and value.is_integer():
+        return int(value)
+    if isinstance(value, str) and value.strip().isdigit():
+        return int(value.strip())
+    return None
+
+
+class ReplyApplier:
+    """
+    Applies reply items to the entries of a batch by id, one item at a time.
+    """
+    def __init__(self, batch: List[POEntry]):
+        self.batch = batch
+        self.translated_ids: Set[int] = set()
+
+    def apply(self, item: Any) -> bool:
+        if not isinstance(item, dict) or 'id' not in item:
+            logger.warning("Openai reply item is missing id: %s", item)
+            return False
+
+        reply_index = coerce_id(item['id'])
+        if reply_index is None or not 0 <= reply_index < len(self.batch) or reply_index in self.translated_ids:
+            logger.warning("Openai reply item has an unknown id: %s", item)
+            return False
+
+        if not apply_item(self.batch[reply_index], item):
+            logger.warning("Openai reply item is missing text or text_plural: %s", item)
+            return False
+
+        self.translated_ids.add(reply_index)
+        return True
+
+    def untranslated(self) -> List[POEntry]:
+        return [entry for i, entry in enumerate(self.batch) if i not in self.translated_ids]
+
+
+def apply_items(batch: List[POEntry], items: List[Any]) -> List[POEntry]:
+    if len(items) != len(batch):
+        logger.warning("Openai reply has %d items for a batch of %d messages", len(items), len(batch))
+
+    applier = ReplyApplier(batch)
+    for item in items:
+        applier.apply(item)
+    return applier.untranslated()
+
+
+class StreamedReply:
+    """
+    Applies the items of a streamed chat completion to the batch as their json closes.
+    Items already applied stay translated if the stream breaks off.
+    """
+    def __init__(self, batch: List[POEntry]):
+        self.applier = ReplyApplier(batch)
+        self.content = ItemStreamParser()
+        self.arguments = ItemStreamParser()
+        self.usage: Optional[Any] = None
+
+    def feed(self, chunk: Any):
+        if chunk.usage:
+            self.usage = chunk.usage
+
+        for choice in chunk.choices:
+            delta = choice.delta
+            items = self.content.feed(delta.content) if delta.content else []
+            for tool_call in delta.tool_calls or []:
+                if tool_call.function and tool_call.function.arguments:
+                    items.extend(self.arguments.feed(tool_call.function.arguments))
+
+            for item in items:
+                if self.applier.apply(item):
+                    logger.debug("Translated message %s of %d", item['id'], len(self.applier.batch))
+
+    def finish(self, error: Optional[Exception] = None) -> List[POEntry]:
+        # Returns the untranslated entries, re-raises a broken stream that translated nothing
+        translated_count = len(self.applier.translated_ids)
+        if error is not None:
+            if not translated_count:
+                raise error
+            logger.warning("Openai stream broke off after %d of %d messages: %s", translated_count, len(self.applier.batch), str(error))
+        elif not translated_count:
+            logger.error("Could not parse streamed openai reply: %s", self.content.buffer or self.arguments.buffer)
+
+        return self.applier.untranslated()
+
+
+def read_stream(stream: Any, batch: List[POEntry]) -> Tuple[List[POEntry], Any]:
+    # Returns the untranslated entries and the usage reported at the end of the stream
+    reply = StreamedReply(batch)
+    try:
+        for chunk in stream:
+            reply.feed(chunk)
+    except Exception as e:
+        return reply.finish(e), reply.usage
+
+    logger.info("Got reply from openai")
+    return reply.finish(), reply.usage
+
+
+async def read_stream_async(stream: Any, batch: List[POEntry]) -> Tuple[List[POEntry], Any]:
+    reply = StreamedReply(batch)
+    try:
+        async for chunk in stream:
+            reply.feed(chunk)
+    except Exception as e:
+        return reply.finish(e), reply.usage
+
+    logger.info("Got reply from openai")
+    return reply.finish(), reply.usage
+
+
+def stream_arguments(stream_completions: bool) -> Dict[str, Any]:
+    if not stream_completions:
+        return {}
+    return {'stream': True, 'stream_options': {'include_usage': True}}
+
+
+def record_usage(usage: Any):
+    if usage:
+        metrics.openai_tokens.inc(usage.prompt_tokens, direction='in')
+        metrics.openai_tokens.inc(usage.completion_tokens, direction='out')
+        timing.summary.record_tokens(usage.prompt_tokens, usage.completion_tokens)
+
+
+def resolve_duplicates(groups: Dict[Tuple[str, str, str], List[POEntry]], failed: List[POEntry]) -> List[POEntry]:
+    # Copies each translated source entry to its duplicates and returns every entry left untranslated
+    failed_ids = {id(entry) for entry in failed}
+    untranslated = []
+    for source, *duplicates in groups.values():
+        if id(source) in failed_ids:
+            untranslated.append(source)
+            untranslated.extend(duplicates)
+            continue
+
+        for entry in duplicates:
+            copy_translation(source, entry)
+
+    return untranslated
+
+
+def split_in_half(batch: List[POEntry]) -> List[List[POEntry]]:
+    split_index = len(batch) // 2
+    return [batch[:split_index], batch[split_index:]]
+
+
+def read_completion(chat_completion: Any, batch: List[POEntry]) -> Tuple[List[POEntry], Any]:
+    # Returns the untranslated entries and the usage of a chat completion that was not streamed
+    content, arguments = message_reply(chat_completion.choices[0].message)
+    logger.info("Got reply from openai")
+    return apply_structured_reply(batch, content, arguments), chat_completion.usage
+
+
+class BatchRequest:
+    """
+    One OpenAI request: the entries left to translate after the translation memory,
+    the model and rate limiter they go to, the request arguments and the tokens reserved for them.
+    """
+    def __init__(self, batch: List[POEntry], model: str, rate_limiter: RateLimiter, arguments: Dict[str, Any], reserved_tokens: int):
+        self.batch = batch
+        self.model = model
+        self.rate_limiter = rate_limiter
+        self.arguments = arguments
+        self.reserved_tokens = reserved_tokens
+
+
+class BatchProgress:
+    def __init__(self, total_count: int):
+        self.total_count = total_count
+        self.translated_count = 0
+
+    def record(self, translated_count: int):
+        self.translated_count += translated_count
+        logger.info("Translated %d out of %d messages", self.translated_count, self.total_count)
+
+
+class TranslatorBase:
+    """
+    The steps Translator and AsyncTranslator share: packing entries into batches and resolving duplicates,
+    and everything before and after an OpenAI request. The subclasses only send the request and read the reply.
+    """
+    def __init__(
+            self,
+            concurrency: int = 1,
+            memory: Optional[TranslationMemory] = None,
+            token_budget: Optional[Dict[str, int]] = None,
+            rate_limiter: Optional[RateLimiter] = None,
+            structured_output: bool = True,
+            stream_completions: bool = False,
+            router: Optional[ModelRouter] = None):
+        self.concurrency = max(1, concurrency)
+        self.memory = memory
+        self.token_budget = token_budget
+        # A limiter passed in is used for every model
+        self.rate_limiter = rate_limiter
+        self.structured_output = structured_output
+        self.stream_completions = stream_completions
+        self.router = router or ModelRouter()
+
+    def _pack_entries(
+            self,
+            entries: List[POEntry],
+            language_code: str) -> Tuple[Dict[Tuple[str, str, str], List[POEntry]], List[POEntry], List[List[POEntry]]]:
+        # Returns the entries grouped by source, one entry of each group and the batches of those
+        groups = group_by_source(entries)
+        unique_entries = [group[0] for group in groups.values()]
+        if len(unique_entries) < len(entries):
+            logger.info("Translating %d distinct messages for %d entries", len(unique_entries), len(entries))
+
+        batches = self.router.pack(unique_entries, language_code, self.token_budget)
+        logger.info("Translating %d messages in %d batches, %d at a time", len(unique_entries), len(batches), self.concurrency)
+        return groups, unique_entries, batches
+
+    @staticmethod
+    def _resolve_entries(
+            groups: Dict[Tuple[str, str, str], List[POEntry]],
+            unique_entries: List[POEntry],
+            failed: List[POEntry]) -> List[POEntry]:
+        # Returns the entries that could not be translated, raises if none could
+        if len(failed) == len(unique_entries):
+            raise Exception(f"Could not translate any of {len(unique_entries)} messages")
+
+        if failed:
+            logger.error("Giving up on %d out of %d messages", len(failed), len(unique_entries))
+
+        return resolve_duplicates(groups, failed)
+
+    @staticmethod
+    def _plan_retry(
+            batch: List[POEntry],
+            batch_failed: List[POEntry],
+            attempt: int,
+            reply_received: bool) -> Tuple[List[List[POEntry]], float]:
+        # Returns the batches to retry after attempt attempts and the delay before them, none when giving up
+        if attempt >= MAX_ATTEMPTS:
+            logger.error("Giving up on %d messages after %d attempts", len(batch_failed), attempt)
+            return [], 0.0
+
+        # A reply where nothing parsed usually means the request was too large for the model
+        retry_batches = [batch_failed]
+        if reply_received and len(batch_failed) == len(batch) and len(batch) > 1:
+            retry_batches = split_in_half(batch_failed)
+
+        delay = backoff_delay(attempt)
+        timing.record_retry('translate_batch', delay, len(retry_batches))
+        logger.warning(
+            "Retrying %d messages in %.1f seconds (attempt %d/%d)",
+            len(batch_failed), delay, attempt + 1, MAX_ATTEMPTS)
+        return retry_batches, delay
+
+    def _prepare_batch(self, batch: List[POEntry], language: str) -> Optional[BatchRequest]:
+        # None if the translation memory already knows every message of the batch
+        if self.memory:
+            batch = self.memory.fill(batch, language)
+            if not batch:
+                return None
+
+        model = self.router.route(batch, language)
+        arguments = {**build_request(batch, language, self.structured_output, model), **stream_arguments(self.stream_completions)}
+        # OpenAI counts the prompt and max_tokens against the quota when it accepts the request,
+        # settle() gives back what the reply did not use
+        return BatchRequest(
+            batch,
+            model,
+            self.rate_limiter or rate_limiters.get(model),
+            arguments,
+            estimate_prompt_tokens(batch) + arguments['max_tokens'],
         )
 
+    @contextmanager
+    def _sending(self, request: BatchRequest):
+        # Wraps sending the request and reading the reply
+        logger.info("Sending translation request to %s for %d messages", request.model, len(request.batch))
+        metrics.batch_size.observe(len(request.batch))
+        metrics.openai_requests_in_flight.inc()
+        try:
+            with metrics.openai_request_duration.time():
+                yield
+        except RateLimitError as e:
+            metrics.openai_rate_limited.inc()
+            request.rate_limiter.block(e.response.headers)
+            raise
+        finally:
+            metrics.openai_requests_in_flight.dec()
+
+    def _finish_batch(self, request: BatchRequest, language: str, failed: List[POEntry], usage: Any) -> List[POEntry]:
+        request.rate_limiter.settle(request.reserved_tokens, usage.total_tokens if usage else None)
+        record_usage(usage)
+
+        if self.memory:
+            failed_ids = {id(entry) for entry in failed}
+            self.memory.store([entry for entry in request.batch if id(entry) not in failed_ids], language)
+
+        if failed:
+            logger.warning("Batch translated with %d out of %d messages missing", len(failed), len(request.batch))
+        else:
+            logger.info("Batch translated successfully")
+        return failed
+
+
+class Translator(TranslatorBase):
+    def __init__(self, openai: Optional[OpenAI] = None, **kwargs: Any):
+        super().__init__(**kwargs)
+        self.openai = openai or get_openai_client()
+
     def tanslate_po_file(self, contents: str, language_code: str) -> Tuple[POFile, int]:
         po = polib.pofile(contents)
 
-        messages_to_translate = []
-        untranslated_messages = po.untranslated_entries()
-        for message in po:
-            if message in untranslated_messages or message.msgstr == '' or message.fuzzy:
-                messages_to_translate.append(message)
-
+        messages_to_translate = select_messages_to_translate(po)
         if not messages_to_translate:
             return po, 0
 
-        self.__translate(messages_to_translate, language_code)
+        untranslated = self.translate_entries(messages_to_translate, language_code)
+
+        return po, len(messages_to_translate) - len(untranslated)
+
+    def translate_po_files(self, contents: List[str], language_code: str) -> List[Tuple[POFile, int]]:
+        # Translates several files of one language, sending each distinct source string only once
+        pos = [polib.pofile(file_contents) for file_contents in contents]
+        messages_per_file = [select_messages_to_translate(po) for po in pos]
+
+        untranslated = self.translate_entries(
+            [message for messages in messages_per_file for message in messages], language_code)
+        untranslated_ids = {id(entry) for entry in untranslated}
+
+        return [
+            (po, sum(1 for message in messages if id(message) not in untranslated_ids))
+            for po, messages in zip(pos, messages_per_file)
+        ]
+
+    def translate_entries(self, entries: List[POEntry], language_code: str) -> List[POEntry]:
+        # Returns the entries that could not be translated, raises if none could
+        if not entries:
+            return []
+
+        groups, unique_entries, batches = self._pack_entries(entries, language_code)
+        with timing.span('translate'):
+            failed = self.__translate_batches(batches, language_code)
+        return self._resolve_entries(groups, unique_entries, failed)
+
+    def __translate_batches(self, batches: List[List[POEntry]], language: str) -> List[POEntry]:
+        progress = BatchProgress(sum(len(batch) for batch in batches))
+        failed: List[POEntry] = []
+
+        # Retries wait in this heap rather than in a worker, so a backoff never holds a request slot
+        sequence = itertools.count()
+        pending = [(0.0, next(sequence), batch, 0) for batch in batches]
+        heapq.heapify(pending)
+        metrics.queue_depth.inc(len(pending), queue='batches')
+
+        # Keep the caller's thread name so log records still carry project/component/language
+        parent_thread_name = threading.current_thread().name
+
+        def translate_batch(batch: List[POEntry]) -> List[POEntry]:
+            threading.current_thread().name = parent_thread_name
+            with timing.span('translate_batch'):
+                return self.__translate_batch(batch, language)
+
+        with ThreadPoolExecutor(max_workers=self.concurrency) as executor:
+            in_flight: Dict[Future, Tuple[List[POEntry], int]] = {}
+            while pending or in_flight:
+                now = time.monotonic()
+                while pending and pending[0][0] <= now and len(in_flight) < self.concurrency:
+                    _, _, batch, attempt = heapq.heappop(pending)
+                    metrics.queue_depth.dec(queue='batches')
+                    in_flight[executor.submit(translate_batch, batch)] = (batch, attempt)
+
+                timeout = None
+                if pending and len(in_flight) < self.concurrency:
+                    timeout = max(0.0, pending[0][0] - now)
+
+                if not in_flight:
+                    time.sleep(timeout or 0)
+                    continue
+
+                done, _ = wait(in_flight, timeout=timeout, return_when=FIRST_COMPLETED)
+                for future in done:
+                    batch, attempt = in_flight.pop(future)
+                    reply_received = True
+                    try:
+                        batch_failed = future.result()
+                    except Exception:
+                        logger.exception("Failed to translate batch of %d messages", len(batch))
+                        batch_failed = batch
+                        reply_received = False
+
+                    progress.record(len(batch) - len(batch_failed))
+                    if not batch_failed:
+                        continue
+
+                    retry_batches, delay = self._plan_retry(batch, batch_failed, attempt + 1, reply_received)
+                    if not retry_batches:
+                        failed.extend(batch_failed)
+                        continue
+
+                    metrics.queue_depth.inc(len(retry_batches), queue='batches')
+                    for retry_batch in retry_batches:
+                        heapq.heappush(pending, (time.monotonic() + delay, next(sequence), retry_batch, attempt + 1))
+
+        return failed
+
+    def __translate_batch(self, batch: List[POEntry], language: str) -> List[POEntry]:
+        request = self._prepare_batch(batch, language)
+        if request is None:
+            return []
+
+        timing.summary.record_rate_limit_wait(request.rate_limiter.acquire(request.reserved_tokens))
+        with self._sending(request):
+            response = self.openai.chat.completions.with_raw_response.create(**request.arguments)
+            request.rate_limiter.update_from_headers(response.headers)
+            if self.stream_completions:
+                # Items are applied as they arrive, a broken stream keeps the ones already received
+                failed, usage = read_stream(response.parse(), request.batch)
+            else:
+                failed, usage = read_completion(response.parse(), request.batch)
 
-        return po, len(messages_to_translate)
+        return self._finish_batch(request, language, failed, usage)
 
-    def __translate(
-            self,
-            messages: List[POEntry],
-            language: str,
-            max_messages_per_request: int = 100,
-            total_count: Optional[int] = None,
-            translated_count: Optional[int] = 0,
-            recursion_depth: int = 0):
-
-        recursion_depth += 1
-
-        if recursion_depth > 1000:
-            raise Exception("Recursion depth exceeded")
-
-        if total_count is None:
-            total_count = len(messages)
-
-        if not messages or max_messages_per_request < 1:
-            return
-
-        batches = []
-        if len(messages) > max_messages_per_request:
-            split_index = len(messages) // 2
-            batches.append(messages[:split_index])
-            batches.append(messages[split_index:])
-
-            for batch in batches:
-                try:
-                    self.__translate(
-                        batch,
-                        language,
-                        max_messages_per_request=max_messages_per_request,
-                        total_count=total_count,
-                        translated_count=translated_count,
-                        recursion_depth=recursion_depth)
-                except Exception:
-                    logger.exception("Failed to translate batch. Taking a break before retrying with smaller batch")
-                    time.sleep(60)
-                    self.__translate(
-                        batch,
-                        language,
-                        max_messages_per_request=max_messages_per_request // 2,
-                        total_count=total_count,
-                        translated_count=translated_count,
-                        recursion_depth=recursion_depth)
-
-                translated_count += len(batch)
-        else:
-            self.__translate_batch(messages, language)
-            translated_count += len(messages)
-            logger.info("Translated %d out of %d messages", translated_count, total_count)
 
-    def __translate_batch(self, batch: List[POEntry], language: str):
-        input_json = []
-        for i, entry in enumerate(batch):
-            input_data = {"id": i}
+class AsyncTranslator(TranslatorBase):
+    def __init__(self, openai: Optional[AsyncOpenAI] = None, **kwargs: Any):
+        super().__init__(**kwargs)
+        self.openai = openai or get_async_openai_client()
+        self.semaphore = asyncio.Semaphore(self.concurrency)
 
-            if entry.msgid_plural:
-                input_data.update({"text": entry.msgid, "text_plural": entry.msgid_plural})
-            else:
-                input_data["text"] = entry.msgid
-
-            input_json.append(input_data)
-        input_json_text = json.dumps(input_json)
-
-        client = self.openai
-        prompt = f"""
-        I have a list of messages in english.
-        I need to translate them to {language}.
-
-        Reply with the same json list, but with the translated messages.
-
-        {input_json_text}
-        """
-
-        logger.info("Sending translation request to openai for %d messages", len(batch))
-        chat_completion = client.chat.completions.create(
-            messages=[
-                {
-                    "role": "user",
-                    "content": prompt,
-                }
-            ],
-            model="gpt-4",
-            stop=[
-                "\n\n\n",
-            ]
-        )
+    async def tanslate_po_file(self, contents: str, language_code: str) -> Tuple[POFile, int]:
+        po = polib.pofile(contents)
 
-        reply = chat_completion.choices[0].message.content
-        logger.info("Got reply from openai")
+        messages_to_translate = select_messages_to_translate(po)
+        if not messages_to_translate:
+            return po, 0
 
-        pattern = r'\[.+\]'
-        matches = re.findall(pattern, reply, re.DOTALL)
-        if not matches:
-            parse_error_message = f"Could not parse openai reply: {reply}"
-            logger.error(parse_error_message)
-            raise Exception(parse_error_message)
+        untranslated = await self.translate_entries(messages_to_translate, language_code)
 
-        reply = matches[0]
+        return po, len(messages_to_translate) - len(untranslated)
 
-        try:
-            reply = json.loads(reply)
-        except json.JSONDecodeError as e:
-            parse_error_message = f"Could not load json from openai reply: {reply}"
-            logger.exception(parse_error_message)
-            raise
+    async def translate_entries(self, entries: List[POEntry], language_code: str) -> List[POEntry]:
+        # Returns the entries that could not be translated, raises if none could
+        if not entries:
+            return []
 
-        if len(reply) != len(batch):
-            parse_error_message = f"Openai reply has different length than batch: {reply}"
-            logger.error(parse_error_message)
-            raise Exception(parse_error_message)
-
-        for i, (translation_reply, translation) in enumerate(zip(reply, batch)):
-            if 'id' not in translation_reply:
-                parse_error_message = f"Openai reply is missing id: {reply}"
-                logger.error(parse_error_message)
-                raise Exception(parse_error_message)
-
-            reply_index = translation_reply['id']
-            if reply_index != i:
-                parse_error_message = f"Openai reply has different order than batch: {reply}"
-                logger.error(parse_error_message)
-                raise Exception(parse_error_message)
-
-            if not translation.msgid_plural:
-                if 'text' not in translation_reply:
-                    parse_error_message = f"Openai reply is missing text: {reply}"
-                    logger.error(parse_error_message)
-                    raise Exception(parse_error_message)
-
-                translation.msgstr = translation_reply['text']
-            else:
-                if 'text' not in translation_reply or 'text_plural' not in translation_reply:
-                    parse_error_message = f"Openai reply is missing text or text_plural: {reply}"
-                    logger.error(parse_error_message)
-                    raise Exception(parse_error_message)
+        groups, unique_entries, batches = self._pack_entries(entries, language_code)
+        progress = BatchProgress(len(unique_entries))
+        with timing.span('translate'):
+            results = await asyncio.gather(*[self.__translate(batch, language_code, progress) for batch in batches])
 
-                translation.msgstr_plural = {
-                    '0': translation_reply['text'],
-                    '1': translation_reply['text_plural']
-                }
+        failed = [entry for batch_failed in results for entry in batch_failed]
+        return self._resolve_entries(groups, unique_entries, failed)
 
-            translation.fuzzy = False
+    async def __translate(
+            self,
+            batch: List[POEntry],
+            language: str,
+            progress: BatchProgress,
+            attempt: int = 0,
+            delay: float = 0.0) -> List[POEntry]:
+        # Returns the entries that were still untranslated after the last attempt
+        metrics.queue_depth.inc(queue='batches')
+        if delay:
+            await asyncio.sleep(delay)
+
+        async with self.semaphore:
+            metrics.queue_depth.dec(queue='batches')
+            reply_received = True
+            try:
+                with timing.span('translate_batch'):
+                    batch_failed = await self.__translate_batch(batch, language)
+            except Exception:
+                logger.exception("Failed to translate batch of %d messages", len(batch))
+                batch_failed = batch
+                reply_received = False
+
+        progress.record(len(batch) - len(batch_failed))
+        if not batch_failed:
+            return []
+
+        retry_batches, delay = self._plan_retry(batch, batch_failed, attempt + 1, reply_received)
+        if not retry_batches:
+            return batch_failed
+
+        results = await asyncio.gather(*[
+            self.__translate(retry_batch, language, progress, attempt + 1, delay) for retry_batch in retry_batches
+        ])
+        return [entry for retry_failed in results for entry in retry_failed]
+
+    async def __translate_batch(self, batch: List[POEntry], language: str) -> List[POEntry]:
+        request = self._prepare_batch(batch, language)
+        if request is None:
+            return []
+
+        timing.summary.record_rate_limit_wait(await request.rate_limiter.acquire_async(request.reserved_tokens))
+        with self._sending(request):
+            response = await self.openai.chat.completions.with_raw_response.create(**request.arguments)
+            request.rate_limiter.update_from_headers(response.headers)
+            if self.stream_completions:
+                failed, usage = await read_stream_async(response.parse(), request.batch)
+            else:
+                failed, usage = read_completion(response.parse(), request.batch)
 
-        logger.info("Batch translated successfully")
+        return self._finish_batch(request, language, failed, usage)
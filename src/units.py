@@ -0,0 +1,140 @@
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, List, Optional, Tuple
+
+from polib import POEntry
+
+import timing
+from retry import retry_call
+from translator import Translator
+from weblate_client import get_weblate_client
+
+logger = logging.getLogger(__name__)
+
+# Unit states of the Weblate API
+STATE_EMPTY = 0
+STATE_FUZZY = 10
+STATE_TRANSLATED = 20
+
+# Weblate search query matching empty and fuzzy units
+PENDING_UNITS_QUERY = 'state:<translated'
+
+
+def unit_needs_translation(unit: Dict[str, Any]) -> bool:
+    # Read-only units have state 100 and are never picked
+    return unit.get('state', STATE_EMPTY) < STATE_TRANSLATED
+
+
+def unit_to_entry(unit: Dict[str, Any]) -> POEntry:
+    source = unit['source']
+    return POEntry(
+        msgid=source[0],
+        msgid_plural=source[1] if len(source) > 1 else '',
+        msgctxt=unit.get('context') or None,
+    )
+
+
+def plural_forms(unit: Dict[str, Any]) -> int:
+    return max(2, len(unit.get('target') or []))
+
+
+def entry_target(entry: POEntry, unit: Dict[str, Any]) -> List[str]:
+    if not entry.msgid_plural:
+        return [entry.msgstr]
+
+    # The reply has a singular and a plural form, the language may need more
+    singular, plural = entry.msgstr_plural['0'], entry.msgstr_plural['1']
+    return [singular] + [plural] * (plural_forms(unit) - 1)
+
+
+def entry_state(entry: POEntry, unit: Dict[str, Any]) -> int:
+    # Extra plural forms only repeat the plural of the reply, which is wrong for languages
+    # such as Polish, Russian or Czech, so those units are left for review
+    if entry.msgid_plural and plural_forms(unit) > 2:
+        return STATE_FUZZY
+    return STATE_TRANSLATED
+
+
+def patch_unit(unit: Dict[str, Any], entry: POEntry) -> bool:
+    ATTEMPTS = 3
+    PAUSE_SECONDS = 10
+    unit_url = unit['url']
+
+    def patch() -> bool:
+        with timing.span('upload'):
+            get_weblate_client().patch_unit(unit_url, entry_target(entry, unit), entry_state(entry, unit))
+        return True
+
+    return bool(retry_call(patch, f'update unit {unit_url}', 'upload', ATTEMPTS, PAUSE_SECONDS, log_attempts=False))
+
+
+def translate_units(
+        translation: Dict[str, Any],
+        units: List[Dict[str, Any]],
+        translator_kwargs: Optional[Dict[str, Any]] = None,
+        patch_concurrency: int = 8) -> bool:
+    language = f"{translation['language_code']}-{translation['language']['name']}"
+    logger.info('Translating %d units for language: %s', len(units), language)
+
+    entries = [unit_to_entry(unit) for unit in units]
+    try:
+        untranslated = Translator(**(translator_kwargs or {})).translate_entries(entries, language)
+    except Exception as e:
+        logger.exception("Translation failed for %s: %s", language, str(e))
+        return False
+
+    untranslated_ids = {id(entry) for entry in untranslated}
+    translated = [(unit, entry) for unit, entry in zip(units, entries) if id(entry) not in untranslated_ids]
+
+    # Weblate has no bulk unit endpoint, so the PATCH requests go out in parallel over the pooled client
+    parent_thread_name = threading.current_thread().name
+
+    def update_unit(unit_and_entry: Tuple[Dict[str, Any], POEntry]) -> bool:
+        threading.current_thread().name = parent_thread_name
+        return patch_unit(*unit_and_entry)
+
+    with ThreadPoolExecutor(max_workers=max(1, patch_concurrency)) as executor:
+        updated_count = sum(executor.map(update_unit, translated))
+
+    timing.summary.record_strings(updated_count)
+    logger.info('Updated %d out of %d units for language: %s', updated_count, len(units), language)
+    fuzzy_count = sum(1 for unit, entry in translated if entry_state(entry, unit) == STATE_FUZZY)
+    if fuzzy_count:
+        logger.info('Marked %d units with more than two plural forms as needing review', fuzzy_count)
+    return updated_count == len(units)
+
+
+def fetch_pending_units(translation: Dict[str, Any]) -> Optional[List[Dict[str, Any]]]:
+    ATTEMPTS = 3
+    PAUSE_SECONDS = 60
+    translation_url = translation['url']
+
+    def fetch() -> List[Dict[str, Any]]:
+        with timing.span('download'):
+            units = list(get_weblate_client().list_translation_units(translation_url, PENDING_UNITS_QUERY))
+        logger.info('Found %d pending units for %s', len(units), translation_url)
+        return [unit for unit in units if unit_needs_translation(unit)]
+
+    return retry_call(fetch, f'fetch pending units for {translation_url}', 'download', ATTEMPTS, PAUSE_SECONDS)
+
+
+def translate_translation_units(
+        translations: List[Dict[str, Any]],
+        translator_kwargs: Optional[Dict[str, Any]] = None,
+        patch_concurrency: int = 8) -> bool:
+    # Translates the pending units of one or more translations of the same language
+    success = True
+    units = []
+    for translation in translations:
+        translation_units = fetch_pending_units(translation)
+        if translation_units is None:
+            success = False
+            continue
+        units.extend(translation_units)
+
+    if not units:
+        logger.info('No pending units found - translation process complete.')
+        return success
+
+    return translate_units(translations[0], units, translator_kwargs, patch_concurrency) and success
@@ -0,0 +1,242 @@
+import logging
+import os
+import threading
+from typing import Any, AsyncIterator, BinaryIO, Dict, Iterator, List, Optional, Union
+
+import httpx
+
+logger = logging.getLogger(__name__)
+
+
+def get_weblate_settings() -> Dict[str, Optional[str]]:
+    return {
+        'url': os.environ.get('WEBLATE_API_URL'),
+        'key': os.environ.get('WEBLATE_API_KEY'),
+    }
+
+
+def build_headers(key: Optional[str]) -> Dict[str, str]:
+    headers = {'Accept': 'application/json'}
+    if key:
+        headers['Authorization'] = f'Token {key}'
+    return headers
+
+
+class WeblateClient:
+    """
+    Minimal client for the Weblate REST API.
+    Keeps one keep-alive connection pool for every request of the run.
+    """
+    def __init__(self, url: Optional[str] = None, key: Optional[str] = None, max_connections: int = 10):
+        settings = get_weblate_settings()
+        self.url = (url or settings['url'] or '').rstrip('/') + '/'
+        self.http = httpx.Client(
+            headers=build_headers(key or settings['key']),
+            timeout=60 * 5,
+            limits=httpx.Limits(max_connections=max_connections, max_keepalive_connections=max_connections),
+        )
+
+    def __enter__(self) -> 'WeblateClient':
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def close(self):
+        self.http.close()
+
+    def absolute_url(self, path: str) -> str:
+        if path.startswith('http://') or path.startswith('https://'):
+            return path
+        return self.url + path.lstrip('/')
+
+    def get(self, path: str, **params) -> Any:
+        response = self.http.get(self.absolute_url(path), params=params or None)
+        response.raise_for_status()
+        return response.json()
+
+    def post(self, path: str, **kwargs) -> Any:
+        response = self.http.post(self.absolute_url(path), **kwargs)
+        response.raise_for_status()
+        return response.json()
+
+    def patch(self, path: str, **kwargs) -> Any:
+        response = self.http.patch(self.absolute_url(path), **kwargs)
+        response.raise_for_status()
+        return response.json()
+
+    def paginate(self, path: str, **params) -> Iterator[Dict[str, Any]]:
+        url: Optional[str] = self.absolute_url(path)
+        while url:
+            page = self.get(url, **params)
+            # The "next" link already carries the query string
+            params = {}
+            yield from page['results']
+            url = page.get('next')
+
+    def list_components(self, project: str) -> Iterator[Dict[str, Any]]:
+        return self.paginate(f'projects/{project}/components/')
+
+    def list_component_translations(self, component: Dict[str, Any]) -> Iterator[Dict[str, Any]]:
+        return self.paginate(component['translations_url'])
+
+    def list_changes(self, project: str, since: str) -> Iterator[Dict[str, Any]]:
+        return self.paginate(f'projects/{project}/changes/', timestamp_after=since)
+
+    def list_translation_units(self, translation_url: str, query: Optional[str] = None) -> Iterator[Dict[str, Any]]:
+        if query:
+            return self.paginate(translation_url + 'units/', q=query)
+        return self.paginate(translation_url + 'units/')
+
+    def get_unit(self, unit_url: str) -> Dict[str, Any]:
+        return self.get(unit_url)
+
+    def patch_unit(self, unit_url: str, target: List[str], state: int) -> Dict[str, Any]:
+        return self.patch(unit_url, json={'target': target, 'state': state})
+
+    def get_translation(self, translation_url: str) -> Dict[str, Any]:
+        return self.get(translation_url)
+
+    def download_translation(self, translation_url: str, file_format: str = 'po') -> bytes:
+        response = self.http.get(self.absolute_url(translation_url) + 'file/', params={'format': file_format})
+        response.raise_for_status()
+        return response.content
+
+    def download_translation_to(self, translation_url: str, file: BinaryIO, file_format: str = 'po'):
+        # Writes the file in chunks instead of holding the whole body in memory
+        url = self.absolute_url(translation_url) + 'file/'
+        with self.http.stream('GET', url, params={'format': file_format}) as response:
+            response.raise_for_status()
+            for chunk in response.iter_bytes():
+                file.write(chunk)
+
+    def upload_translation(
+            self,
+            translation_url: str,
+            filename: str,
+            contents: Union[str, bytes, BinaryIO],
+            method: str = 'translate',
+            overwrite: bool = False) -> Dict[str, Any]:
+        return self.post(
+            translation_url + 'file/',
+            files={'file': (filename, contents)},
+            data={'method': method, 'overwrite': 'true' if overwrite else 'false'},
+        )
+
+    def commit(self, translation_url: str) -> Dict[str, Any]:
+        return self.post(translation_url + 'repository/', json={'operation': 'commit'})
+
+    def push(self, translation_url: str) -> Dict[str, Any]:
+        return self.post(translation_url + 'repository/', json={'operation': 'push'})
+
+
+class AsyncWeblateClient:
+    """
+    Minimal asyncio client for the Weblate REST API.
+    """
+    def __init__(self, url: Optional[str] = None, key: Optional[str] = None, max_connections: int = 100):
+        settings = get_weblate_settings()
+        self.url = (url or settings['url'] or '').rstrip('/') + '/'
+        self.http = httpx.AsyncClient(
+            headers=build_headers(key or settings['key']),
+            timeout=60 * 5,
+            limits=httpx.Limits(max_connections=max_connections, max_keepalive_connections=max_connections),
+        )
+
+    async def __aenter__(self) -> 'AsyncWeblateClient':
+        return self
+
+    async def __aexit__(self, *exc_info):
+        await self.close()
+
+    async def close(self):
+        await self.http.aclose()
+
+    def absolute_url(self, path: str) -> str:
+        if path.startswith('http://') or path.startswith('https://'):
+            return path
+        return self.url + path.lstrip('/')
+
+    async def get(self, path: str, **params) -> Any:
+        response = await self.http.get(self.absolute_url(path), params=params or None)
+        response.raise_for_status()
+        return response.json()
+
+    async def post(self, path: str, **kwargs) -> Any:
+        response = await self.http.post(self.absolute_url(path), **kwargs)
+        response.raise_for_status()
+        return response.json()
+
+    async def paginate(self, path: str, **params) -> AsyncIterator[Dict[str, Any]]:
+        url: Optional[str] = self.absolute_url(path)
+        while url:
+            page = await self.get(url, **params)
+            # The "next" link already carries the query string
+            params = {}
+            for result in page['results']:
+                yield result
+            url = page.get('next')
+
+    def list_components(self, project: str) -> AsyncIterator[Dict[str, Any]]:
+        return self.paginate(f'projects/{project}/components/')
+
+    def list_component_translations(self, component: Dict[str, Any]) -> AsyncIterator[Dict[str, Any]]:
+        return self.paginate(component['translations_url'])
+
+    async def get_translation(self, translation_url: str) -> Dict[str, Any]:
+        return await self.get(translation_url)
+
+    async def download_translation(self, translation_url: str, file_format: str = 'po') -> bytes:
+        response = await self.http.get(self.absolute_url(translation_url) + 'file/', params={'format': file_format})
+        response.raise_for_status()
+        return response.content
+
+    async def upload_translation(
+            self,
+            translation_url: str,
+            filename: str,
+            contents: Union[str, bytes],
+            method: str = 'translate',
+            overwrite: bool = False) -> Dict[str, Any]:
+        return await self.post(
+            translation_url + 'file/',
+            files={'file': (filename, contents)},
+            data={'method': method, 'overwrite': 'true' if overwrite else 'false'},
+        )
+
+    async def commit(self, translation_url: str) -> Dict[str, Any]:
+        return await self.post(translation_url + 'repository/', json={'operation': 'commit'})
+
+    async def push(self, translation_url: str) -> Dict[str, Any]:
+        return await self.post(translation_url + 'repository/', json={'operation': 'push'})
+
+
+lock = threading.Lock()
+client: Optional[WeblateClient] = None
+max_connections = 10
+
+
+def configure(connections: Optional[int] = None):
+    # Must run before the first client is created
+    global max_connections
+    if connections:
+        max_connections = connections
+
+
+def get_weblate_client() -> WeblateClient:
+    """
+    Returns the Weblate client shared by every worker thread.
+    """
+    global client
+    with lock:
+        if client is None:
+            client = WeblateClient(max_connections=max_connections)
+        return client
+
+
+def close_weblate_client():
+    global client
+    with lock:
+        if client is not None:
+            client.close()
+            client = None